@@ -9,6 +9,7 @@ setup(
     py_modules=['node_controller', 'resource_manager'],
     install_requires=[
         'bee-rpc@git+https://github.com/bee-rpc-protocol/bee-rpc',
+        'grpcio-health-checking',
     ],
     package_dir={"": "src"},
     packages=find_packages(where="src"),
@@ -1,7 +1,12 @@
 import logging
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Any, Union
 
-from node_controller.dependency_manager.dependency_manager import DependencyManager
+import grpc
+
+from node_controller.dependency_manager.dependency_manager import DependencyManager, IDLE_TTL_INHERIT
+from node_controller.dependency_manager.balancer import InstanceBalancer
+from node_controller.dependency_manager.health_probe import HealthProbe
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy
 from node_controller.dependency_manager.service_interface import ServiceInterface
 from node_controller.gateway.communication import modify_resources as gateway_modify_resources
 from node_controller.gateway.protos import celaut_pb2
@@ -9,6 +14,7 @@ from node_controller.utils.get_grpc_uri import get_grpc_uri
 from node_controller.utils.read_file import read_file
 
 from node_controller.utils.singleton import Singleton
+from resource_manager.pool import SystemRamPool
 from resource_manager.resourcemanager import ResourceManager
 
 
@@ -48,7 +54,8 @@ class Controller(metaclass=Singleton):
         if default_resource_manager:
             ResourceManager(
                 log=lambda message: logging.info(message),
-                ram_pool_method=lambda: self.mem_limit,
+                log_enabled=lambda: logging.getLogger().isEnabledFor(logging.INFO),
+                ram_pool_method=SystemRamPool(default_limit=lambda: self.mem_limit),
                 modify_resources=lambda d: gateway_modify_resources(i=d, node_url=self.node_url)
             )
 
@@ -64,7 +71,14 @@ class Controller(metaclass=Singleton):
                     dynamic: bool = False,
                     timeout: int = None,
                     failed_attempts: int = None,
-                    pass_timeout_times: int = None
+                    pass_timeout_times: int = None,
+                    pool_policy: Optional[InstancePoolPolicy] = None,
+                    max_launching: Optional[int] = None,
+                    channel_options: Optional[List[Tuple[str, Any]]] = None,
+                    compression: Optional[grpc.Compression] = None,
+                    balancer: Optional[InstanceBalancer] = None,  # One per service, it holds its instances.
+                    health_probe: Optional[HealthProbe] = None,
+                    idle_ttl: Union[Optional[float], object] = IDLE_TTL_INHERIT
                     ) -> ServiceInterface:
         return DependencyManager().add_service(
             service_hash=service_hash,
@@ -72,7 +86,14 @@ class Controller(metaclass=Singleton):
             dynamic=dynamic,
             timeout=timeout,
             failed_attempts=failed_attempts,
-            pass_timeout_times=pass_timeout_times
+            pass_timeout_times=pass_timeout_times,
+            pool_policy=pool_policy,
+            max_launching=max_launching,
+            channel_options=channel_options,
+            compression=compression,
+            balancer=balancer,
+            health_probe=health_probe,
+            idle_ttl=idle_ttl
         )
 
     def modify_resources(self, resources: dict) -> Tuple[celaut_pb2.Sysresources, int]:
@@ -0,0 +1,145 @@
+import random
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List
+
+from node_controller.dependency_manager.service_instance import ServiceInstance
+
+CONCURRENCY_DEFAULT = 1
+
+
+class InstanceBalancer(ABC):
+    # Instances of a service that can take one more caller. An instance stays here while it has less
+    #  than `concurrency` callers (in_flight), so several callers can share it when the service allows it.
+    # Must be used with the ServiceConfig lock held.
+
+    def __init__(self, concurrency: int = CONCURRENCY_DEFAULT):
+        if concurrency < 1:
+            raise Exception("The concurrency of an instance must be at least 1.")
+        self.concurrency = concurrency
+
+    def add(self, instance: ServiceInstance, deep: bool = False):
+        # deep puts it where the maintainer takes them, the least recently used end.
+        if not instance.balanced and instance.in_flight < self.concurrency:
+            instance.balanced = True
+            self._add(instance, deep)
+
+    def take(self) -> ServiceInstance:
+        # For a caller. Raises IndexError if there is none.
+        instance = self._select()
+        instance.in_flight += 1
+        if instance.in_flight >= self.concurrency:
+            self.discard(instance)
+        return instance
+
+    def take_idle(self) -> ServiceInstance:
+        # For the maintainer, the least recently used instance without callers. Raises IndexError if there is none.
+        for instance in self.idle():
+            self.discard(instance)
+            return instance
+        raise IndexError
+
+    def idle(self) -> List[ServiceInstance]:
+        # The instances without callers, least recently used first.
+        return [instance for instance in self._by_age() if instance.in_flight == 0]
+
+    def discard(self, instance: ServiceInstance):
+        if instance.balanced:
+            instance.balanced = False
+            self._remove(instance)
+
+    @abstractmethod
+    def _add(self, instance: ServiceInstance, deep: bool):
+        pass
+
+    @abstractmethod
+    def _remove(self, instance: ServiceInstance):
+        pass
+
+    @abstractmethod
+    def _select(self) -> ServiceInstance:
+        pass
+
+    @abstractmethod
+    def _by_age(self) -> List[ServiceInstance]:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def __repr__(self):
+        return type(self).__name__ + str(self._by_age())
+
+
+class LifoBalancer(InstanceBalancer):
+    # Takes the most recently returned instance, the warmest one. The least used ones stay at the
+    #  other end of the deque, where the maintainer detects them.
+
+    def __init__(self, concurrency: int = CONCURRENCY_DEFAULT):
+        super().__init__(concurrency=concurrency)
+        self.instances = deque()
+
+    def _add(self, instance: ServiceInstance, deep: bool):
+        self.instances.appendleft(instance) if deep else self.instances.append(instance)
+
+    def _remove(self, instance: ServiceInstance):
+        if self.instances and self.instances[-1] is instance:
+            self.instances.pop()
+        elif self.instances and self.instances[0] is instance:
+            self.instances.popleft()
+        else:
+            self.instances.remove(instance)
+
+    def _select(self) -> ServiceInstance:
+        return self.instances[-1]
+
+    def _by_age(self) -> List[ServiceInstance]:
+        return list(self.instances)
+
+    def __len__(self) -> int:
+        return len(self.instances)
+
+
+class PowerOfTwoBalancer(InstanceBalancer):
+    # Samples two instances and takes the one with fewer callers.
+    # Kept in a list with O(1) removal by swapping with the last one.
+
+    def __init__(self, concurrency: int = CONCURRENCY_DEFAULT):
+        super().__init__(concurrency=concurrency)
+        self.instances: List[ServiceInstance] = []
+
+    def _add(self, instance: ServiceInstance, deep: bool):
+        instance.balancer_index = len(self.instances)
+        self.instances.append(instance)
+
+    def _remove(self, instance: ServiceInstance):
+        last = self.instances.pop()
+        if last is not instance:
+            last.balancer_index = instance.balancer_index
+            self.instances[last.balancer_index] = last
+
+    def _score(self, instance: ServiceInstance) -> float:
+        return instance.in_flight
+
+    def _select(self) -> ServiceInstance:
+        if not self.instances:
+            raise IndexError
+        if len(self.instances) == 1:
+            return self.instances[0]
+        a, b = random.sample(self.instances, 2)
+        return a if self._score(a) <= self._score(b) else b
+
+    def _by_age(self) -> List[ServiceInstance]:
+        return sorted(self.instances, key=lambda instance: instance.used_at)
+
+    def __len__(self) -> int:
+        return len(self.instances)
+
+
+class EwmaBalancer(PowerOfTwoBalancer):
+    # Power of two choices on the expected latency: the latency EWMA recorded by the leases,
+    #  weighted by the callers the instance already has. Instances without latency data go first.
+
+    def _score(self, instance: ServiceInstance) -> float:
+        return (instance.latency_ewma or 0) * (instance.in_flight + 1)
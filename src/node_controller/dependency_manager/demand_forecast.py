@@ -0,0 +1,64 @@
+from time import monotonic
+from typing import Optional
+
+FORECAST_INTERVAL = 5  # seconds of each arrivals bucket.
+LEVEL_ALPHA = 0.5
+TREND_BETA = 0.3
+LEASE_EWMA_ALPHA = 0.2
+MISSED_INTERVALS_MAX = 60  # Longer silences are taken as this many empty buckets.
+
+
+class DemandForecast(object):
+    # Arrival rate of a service (requests per second), forecast with Holt's linear method over fixed
+    #  buckets, and the EWMA of how long its instances are held. Not thread safe, the ServiceConfig
+    #  lock is held by its callers.
+
+    def __init__(self,
+                 interval: float = FORECAST_INTERVAL,
+                 alpha: float = LEVEL_ALPHA,
+                 beta: float = TREND_BETA,
+                 lease_alpha: float = LEASE_EWMA_ALPHA
+                 ):
+        self.interval = interval
+        self.alpha = alpha
+        self.beta = beta
+        self.lease_alpha = lease_alpha
+
+        self.level: Optional[float] = None
+        self.trend = 0.0
+        self.bucket_start = monotonic()
+        self.bucket_arrivals = 0
+        self.lease_ewma: Optional[float] = None
+
+    def __advance(self):
+        elapsed = int((monotonic() - self.bucket_start) // self.interval)
+        for i in range(min(elapsed, MISSED_INTERVALS_MAX)):
+            rate = (self.bucket_arrivals if i == 0 else 0) / self.interval
+            if self.level is None:
+                self.level = rate
+                continue
+            level = self.alpha * rate + (1 - self.alpha) * (self.level + self.trend)
+            self.trend = self.beta * (level - self.level) + (1 - self.beta) * self.trend
+            self.level = level
+        if elapsed:
+            self.bucket_start += elapsed * self.interval
+            self.bucket_arrivals = 0
+
+    def arrival(self):
+        self.__advance()
+        self.bucket_arrivals += 1
+
+    def lease(self, duration: float):
+        self.lease_ewma = duration if self.lease_ewma is None \
+            else self.lease_alpha * duration + (1 - self.lease_alpha) * self.lease_ewma
+
+    def rate(self, horizon: float = 0) -> float:
+        # Arrivals per second expected `horizon` seconds from now.
+        self.__advance()
+        if self.level is None:
+            return 0.0
+        return max(0.0, self.level + self.trend * horizon / self.interval)
+
+    def concurrency(self, horizon: float = 0) -> float:
+        # Leases expected at the same time (Little's law).
+        return self.rate(horizon) * (self.lease_ewma or 0)
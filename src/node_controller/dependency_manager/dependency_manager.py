@@ -1,13 +1,21 @@
-from datetime import timedelta, datetime
-from threading import Thread, Lock
-from time import sleep
-from typing import Dict, Callable, Any, Tuple, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Event
+from time import sleep, monotonic
+from typing import Dict, Callable, Any, Tuple, Union, Optional, List
 
+import grpc
+
+from node_controller.dependency_manager.balancer import InstanceBalancer
+from node_controller.dependency_manager.health_probe import HealthProbe
+from node_controller.dependency_manager.idle_expiry import IdleExpiry
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy
 from node_controller.dependency_manager.service_interface import ServiceInterface
 from node_controller.dependency_manager.service_instance import ServiceInstance
 from node_controller.dependency_manager.service_config import ServiceConfig
 from node_controller.gateway.communication import generate_gateway_stub
-from node_controller.gateway.protos import gateway_pb2, celaut_pb2, gateway_pb2_grpc
+from node_controller.gateway.connection import GatewayConnection
+from node_controller.gateway.protos import gateway_pb2, celaut_pb2
+from node_controller.gateway.stop_queue import StopQueue, STOP_WORKERS_DEFAULT
 from node_controller.utils.lambdas import SHA3_256, STATIC_SERVICE_DIRECTORY, DYNAMIC_SERVICE_DIRECTORY, \
     STATIC_METADATA_DIRECTORY, DYNAMIC_METADATA_DIRECTORY
 from node_controller.utils.lambdas import LOGGER
@@ -17,6 +25,11 @@ MAINTENANCE_SLEEP_TIME_DEFAULT = 60
 TIMEOUT_DEFAULT = 30
 FAILED_ATTEMPTS_DEFAULT = 20
 PASS_TIMEOUT_TIMES_DEFAULT = 5
+FILL_INTERVAL_DEFAULT = 10
+MAX_LAUNCHING_DEFAULT = 2
+MAINTENANCE_WORKERS_DEFAULT = 8
+IDLE_TTL_DEFAULT = 60  # seconds.
+IDLE_TTL_INHERIT = object()  # An add_service() idle_ttl that takes the manager's one; None disables the expiry.
 
 
 class DependencyManager(metaclass=Singleton):
@@ -32,6 +45,11 @@ class DependencyManager(metaclass=Singleton):
                  failed_attempts: int = FAILED_ATTEMPTS_DEFAULT,
                  pass_timeout_times: int = PASS_TIMEOUT_TIMES_DEFAULT,
                  dev_client: str = None,
+                 fill_interval: int = FILL_INTERVAL_DEFAULT,
+                 max_launching: Optional[int] = MAX_LAUNCHING_DEFAULT,
+                 maintenance_workers: int = MAINTENANCE_WORKERS_DEFAULT,
+                 idle_ttl: Optional[float] = IDLE_TTL_DEFAULT,
+                 stop_workers: int = STOP_WORKERS_DEFAULT,
                  ):
 
         if not node_url:
@@ -41,6 +59,8 @@ class DependencyManager(metaclass=Singleton):
         self.timeout = timeout
         self.failed_attempts = failed_attempts
         self.pass_timeout_times = pass_timeout_times
+        self.max_launching = max_launching
+        self.idle_ttl = idle_ttl
 
         self.dev_client = dev_client
         self.static_service_directory = static_service_directory
@@ -49,56 +69,112 @@ class DependencyManager(metaclass=Singleton):
         self.dynamic_metadata_directory = dynamic_metadata_directory
 
         self.services: Dict[str, ServiceConfig] = {}
-        self.gateway_stub: gateway_pb2_grpc.GatewayStub = generate_gateway_stub(node_url)
+        self.gateway_stub: GatewayConnection = generate_gateway_stub(node_url)
+        self.stop_queue = StopQueue(gateway_stub=self.gateway_stub, workers=stop_workers)
 
         self.lock = Lock()
+        self.maintainers = ThreadPoolExecutor(max_workers=maintenance_workers,
+                                              thread_name_prefix='DependencyMaintainer')
+        self.idle_expiry = IdleExpiry(check=self.__expire)
         Thread(target=self.maintenance, name='DependencyMaintainer').start()
 
+        self.fill_interval = fill_interval
+        self.fill_event = Event()
+        Thread(target=self.filler, name='DependencyFiller').start()
+
+    def filler(self):
+        # Launches instances ahead of demand, and stops the ones above it, following the pool policy of each service.
+        while True:
+            self.fill_event.wait(timeout=self.fill_interval)
+            self.fill_event.clear()
+
+            with self.lock:
+                services = list(self.services.values())
+
+            for service_config in services:
+                with service_config.lock:
+                    deficit = service_config.launch_deficit()
+                    surplus = service_config.retire_surplus()
+
+                for instance in surplus:
+                    LOGGER('      surplus instance --> ' + str(instance))
+                    self.maintainers.submit(service_config.stop_instance, instance=instance,
+                                            gateway_stub=self.gateway_stub, counted=False)
+
+                launched = 0
+                for instance in service_config.launch_instances(self.gateway_stub, deficit):
+                    launched += 1
+                    with service_config.lock:
+                        service_config.end_launch(instance=instance)
+
+                with service_config.lock:
+                    for _ in range(deficit - launched):
+                        service_config.end_launch()
+
     def maintenance(self):
+        # Each sweep checks the suspect idle instances on the worker pool, so a slow probe or stop only holds
+        #  one worker. An instance stays available until its worker takes it out.
+        # Idle instances are expired apart, by idle_expiry.
         while True:
             sleep(self.maintenance_sleep_time)
-            index = 0
-            while True:  # If we do for service in services, the entire loop would need to be blocked.
-                LOGGER('maintainer want services lock' + str(self.lock.locked()))
-                self.lock.acquire()
-
-                try:
-                    service_config: ServiceConfig = self.services[
-                        list(self.services)[index]
-                    ]
-                    index += 1
-                    try:
-                        instance: ServiceInstance = service_config.get_instance(deep=True)
-
-                    except IndexError:
-                        # There are no available instances in this queue.
-                        self.lock.release()
-                        continue
-                except IndexError:
-                    LOGGER('All services have been toured.')
-                    self.lock.release()
-                    break
-                except Exception as e:
-                    LOGGER('ERROR on maintainer, ' + str(e))
-                    self.lock.release()
-                    break
-                self.lock.release()
-
-                LOGGER('      maintain service instance --> ' + str(instance))
-                # In case it has gone unused for too long or is in a 'zombie' state.
-                if datetime.now() - instance.use_datetime > timedelta(
-                        minutes=self.maintenance_sleep_time) \
-                        or instance.is_zombie(
-                    pass_timeout_times=service_config.pass_timeout_times,
-                    timeout=service_config.timeout,
-                    failed_attempts=service_config.failed_attempts
-                ):
-                    instance.stop(self.gateway_stub)
-                # Otherwise, add the instance back to its respective queue.
-                else:
-                    self.lock.acquire()
-                    service_config.add_instance(instance, deep=True)
-                    self.lock.release()
+            with self.lock:
+                services = list(self.services.values())
+
+            for service_config in services:
+                with service_config.lock:
+                    due = [instance for instance in service_config.instances.idle() if instance.suspect(
+                        pass_timeout_times=service_config.pass_timeout_times,
+                        failed_attempts=service_config.failed_attempts
+                    )]
+                for instance in due:
+                    self.maintainers.submit(self.__maintain, service_config, instance)
+            LOGGER('All services have been toured.')
+
+    def __maintain(self, service_config: ServiceConfig, instance: ServiceInstance):
+        # Out of its balancer while it is checked, unless a caller has taken it since the sweep.
+        with service_config.lock:
+            if not instance.balanced or instance.in_flight:
+                return
+            service_config.instances.discard(instance)
+
+        LOGGER('      maintain service instance --> ' + str(instance))
+        try:
+            # In case it is in a 'zombie' state.
+            zombie = instance.is_zombie(
+                pass_timeout_times=service_config.pass_timeout_times,
+                timeout=service_config.timeout,
+                failed_attempts=service_config.failed_attempts
+            )
+        except Exception as e:
+            LOGGER('ERROR on maintainer, ' + str(e))
+            zombie = False
+
+        if zombie:
+            service_config.stop_instance(instance=instance, gateway_stub=self.gateway_stub)
+        # Otherwise, add the instance back to its respective queue.
+        else:
+            with service_config.lock:
+                service_config.add_instance(instance, deep=True)
+
+    def __schedule_expiry(self, service_config: ServiceConfig, instance: ServiceInstance):
+        if service_config.idle_ttl is not None:
+            self.idle_expiry.schedule(service_config, instance, instance.used_at + service_config.idle_ttl)
+
+    def __expire(self, service_config: ServiceConfig, instance: ServiceInstance) -> Optional[float]:
+        # Called by the idle expiry when the idle deadline of the instance is due.
+        with service_config.lock:
+            if not instance.balanced or instance.in_flight or service_config.idle_ttl is None:
+                return None  # Taken, it is scheduled again when given back.
+            deadline = instance.used_at + service_config.idle_ttl
+            if deadline > monotonic() + self.idle_expiry.tolerance:
+                return deadline
+            if service_config.alive <= service_config.pool_policy.min_warm:
+                return monotonic() + service_config.idle_ttl
+            service_config.instances.discard(instance)
+
+        LOGGER('      idle instance expired --> ' + str(instance))
+        service_config.stop_instance(instance=instance, gateway_stub=self.gateway_stub)
+        return None
 
     def add_service(self,
                     service_hash: str,
@@ -106,7 +182,14 @@ class DependencyManager(metaclass=Singleton):
                     dynamic: bool = False,
                     timeout: int = None,
                     failed_attempts: int = None,
-                    pass_timeout_times: int = None
+                    pass_timeout_times: int = None,
+                    pool_policy: Optional[InstancePoolPolicy] = None,
+                    max_launching: Optional[int] = None,
+                    channel_options: Optional[List[Tuple[str, Any]]] = None,
+                    compression: Optional[grpc.Compression] = None,
+                    balancer: Optional[InstanceBalancer] = None,  # One per service, it holds its instances.
+                    health_probe: Optional[HealthProbe] = None,
+                    idle_ttl: Union[Optional[float], object] = IDLE_TTL_INHERIT
                     ) -> ServiceInterface:
 
         if not config:
@@ -129,11 +212,22 @@ class DependencyManager(metaclass=Singleton):
                 static_service_directory=self.static_service_directory,
                 static_metadata_directory=self.static_metadata_directory,
                 dynamic_service_directory=self.dynamic_service_directory,
-                dynamic_metadata_directory=self.dynamic_metadata_directory
+                dynamic_metadata_directory=self.dynamic_metadata_directory,
+                pool_policy=pool_policy,
+                max_launching=max_launching if max_launching else self.max_launching,
+                channel_options=channel_options,
+                compression=compression,
+                balancer=balancer,
+                health_probe=health_probe,
+                idle_ttl=self.idle_ttl if idle_ttl is IDLE_TTL_INHERIT else idle_ttl
             )
+            service_config.refill = self.fill_event.set
+            service_config.stop_queue = self.stop_queue
+            service_config.on_idle = lambda instance: self.__schedule_expiry(service_config, instance)
             self.services.update({
                 service_config_id: service_config
             })
+        self.fill_event.set()
 
         return ServiceInterface(
             service_with_config=service_config,
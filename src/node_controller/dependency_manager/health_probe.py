@@ -0,0 +1,53 @@
+from time import monotonic
+from typing import Callable
+
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from node_controller.dependency_manager.service_instance import ServiceInstance
+from node_controller.utils.lambdas import LOGGER
+
+PROBE_INTERVAL_DEFAULT = 5  # seconds a result is reused.
+
+
+class HealthProbe(object):
+    # Checks that an instance answers, over its cached channel, with the standard grpc.health.v1 protocol.
+    #  If an instance doesn't implement it, the answer already proves that it is alive, and its following
+    #  probes only wait for the channel to be connected. Results are reused for `interval` seconds.
+
+    def __init__(self, service: str = '', interval: float = PROBE_INTERVAL_DEFAULT):
+        self.request = health_pb2.HealthCheckRequest(service=service)
+        self.interval = interval
+
+    def bind(self, instance: ServiceInstance) -> Callable[..., bool]:
+        # The check_if_is_alive(timeout) of the instance.
+        return lambda timeout: self(instance=instance, timeout=timeout)
+
+    def __call__(self, instance: ServiceInstance, timeout: float) -> bool:
+        now = monotonic()
+        if instance.probed_at is not None and now - instance.probed_at < self.interval:
+            return instance.probe_result
+
+        instance.probe_result = self.__probe(instance=instance, timeout=timeout)
+        instance.probed_at = monotonic()
+        return instance.probe_result
+
+    def __probe(self, instance: ServiceInstance, timeout: float) -> bool:
+        if not instance.health_implemented:
+            ready = grpc.channel_ready_future(instance.get_channel())
+            try:
+                ready.result(timeout=timeout)
+                return True
+            except grpc.FutureTimeoutError:
+                ready.cancel()  # Else it keeps watching the channel.
+                return False
+
+        try:
+            response = instance.stub(health_pb2_grpc.HealthStub).Check(self.request, timeout=timeout)
+            return response.status == health_pb2.HealthCheckResponse.SERVING
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                LOGGER('The instance ' + instance.uri + ' does not implement grpc.health.v1.')
+                instance.health_implemented = False
+                return True
+            return False
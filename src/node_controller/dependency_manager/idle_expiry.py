@@ -0,0 +1,58 @@
+from heapq import heappush, heappop
+from itertools import count
+from threading import Condition, Thread
+from time import monotonic
+from typing import Any, Callable, List, Optional, Tuple
+
+from node_controller.dependency_manager.service_instance import ServiceInstance
+from node_controller.utils.lambdas import LOGGER
+
+EXPIRY_TOLERANCE = 0.1  # seconds, deadlines this close are handled together.
+
+
+class IdleExpiry(object):
+    # Heap of idle deadlines on the monotonic clock, with at most one entry per instance. When a deadline is
+    #  due, check(owner, instance) expires the instance, or returns the deadline to check it again
+    #  (if it was used meanwhile). Instances that are taken are scheduled again when given back.
+
+    def __init__(self,
+                 check: Callable[[Any, ServiceInstance], Optional[float]],
+                 tolerance: float = EXPIRY_TOLERANCE
+                 ):
+        self.check = check
+        self.tolerance = tolerance
+        self.heap: List[Tuple[float, int, Any, ServiceInstance]] = []
+        self.seq = count()
+        self.condition = Condition()
+        Thread(target=self.run, name='DependencyIdleExpiry', daemon=True).start()
+
+    def schedule(self, owner: Any, instance: ServiceInstance, deadline: float):
+        with self.condition:
+            if instance.expiry_scheduled:
+                return
+            instance.expiry_scheduled = True
+            heappush(self.heap, (deadline, next(self.seq), owner, instance))
+            if self.heap[0][3] is instance:
+                self.condition.notify()
+
+    def __due(self) -> List[Tuple[float, int, Any, ServiceInstance]]:
+        with self.condition:
+            while not self.heap or self.heap[0][0] > monotonic() + self.tolerance:
+                self.condition.wait(timeout=self.heap[0][0] - monotonic() if self.heap else None)
+            due, limit = [], monotonic() + self.tolerance
+            while self.heap and self.heap[0][0] <= limit:
+                entry = heappop(self.heap)
+                entry[3].expiry_scheduled = False
+                due.append(entry)
+            return due
+
+    def run(self):
+        while True:
+            for _, _, owner, instance in self.__due():
+                try:
+                    deadline = self.check(owner, instance)
+                except Exception as e:
+                    LOGGER('ERROR on idle expiry, ' + str(e))
+                    continue
+                if deadline is not None:
+                    self.schedule(owner, instance, deadline)
@@ -0,0 +1,52 @@
+import asyncio
+from time import monotonic
+from typing import Optional
+
+import grpc
+
+from node_controller.dependency_manager.service_instance import ServiceInstance
+
+
+class InstanceLease(object):
+    # Takes an instance from its ServiceInterface and always gives it back: pushed to its queue,
+    #  or stopped if the errors turned it into a zombie. Records the latency and outcome of the use.
+
+    def __init__(self, service_interface, timeout: Optional[float] = None):
+        self.service_interface = service_interface
+        self.timeout = timeout
+        self.instance: Optional[ServiceInstance] = None
+        self.start: float = 0
+        self.latency: Optional[float] = None
+        self.outcome: Optional[str] = None
+
+    def __enter__(self) -> ServiceInstance:
+        self.instance = self.service_interface.get_instance(timeout=self.timeout)
+        self.start = monotonic()
+        return self.instance
+
+    def __exit__(self, _type, value, traceback):
+        self.__release(value, latency=monotonic() - self.start)
+        return False
+
+    async def __aenter__(self) -> ServiceInstance:
+        self.instance = await self.service_interface.aget_instance(timeout=self.timeout)
+        self.start = monotonic()
+        return self.instance
+
+    async def __aexit__(self, _type, value, traceback):
+        # Off the loop: an error outcome waits for a loading service, and the push may stop a zombie.
+        await asyncio.to_thread(self.__release, value, monotonic() - self.start)
+        return False
+
+    def __release(self, e: Optional[BaseException], latency: float):
+        self.latency = latency
+        if e is None:
+            self.outcome = 'ok'
+            self.instance.reset_timers()
+        elif isinstance(e, grpc.RpcError):
+            self.outcome = self.instance.compute_exception(e)
+        else:
+            # Not the instance's fault.
+            self.outcome = 'exception'
+        self.instance.record(latency=self.latency, outcome=self.outcome)
+        self.service_interface.push_instance(self.instance)
@@ -0,0 +1,117 @@
+from math import ceil
+from time import monotonic
+from typing import Callable, Optional
+
+from node_controller.dependency_manager.demand_forecast import DemandForecast
+
+MIN_WARM_DEFAULT = 0
+TARGET_SPARE_DEFAULT = 0
+LEAD_TIME_DEFAULT = 10  # seconds, about the time a launch takes.
+HEADROOM_DEFAULT = 0.2
+IDLE_BUDGET_DEFAULT = 60  # instance-seconds.
+
+
+class InstancePoolPolicy(object):
+    # How many instances of a service are kept launched ahead of demand.
+    #  min_warm: instances kept alive even when idle.
+    #  max_instances: upper bound of alive instances (None is unbounded).
+    #  target_spare: idle instances kept ready to be taken.
+    # Its methods are called with the ServiceConfig lock held.
+
+    def __init__(self,
+                 min_warm: int = MIN_WARM_DEFAULT,
+                 max_instances: Optional[int] = None,
+                 target_spare: int = TARGET_SPARE_DEFAULT
+                 ):
+        if max_instances is not None and max_instances < min_warm:
+            raise Exception("max_instances can't be lower than min_warm.")
+        self.min_warm = min_warm
+        self.max_instances = max_instances
+        self.target_spare = target_spare
+        # Callers an instance takes at once, set by its ServiceConfig from its balancer.
+        self.concurrency: Callable[[], int] = lambda: 1
+
+    def deficit(self, alive: int, idle: int, launching: int) -> int:
+        # Instances to launch now, counting the ones already being launched.
+        needed = max(
+            self.min_warm - (alive + launching),
+            self.target_spare - (idle + launching),
+            0
+        )
+        if self.max_instances is not None:
+            needed = min(needed, max(0, self.max_instances - (alive + launching)))
+        return needed
+
+    def surplus(self, alive: int, idle: int) -> int:
+        # Idle instances to stop now, apart from the idle expiry.
+        return 0
+
+    def arrival(self):
+        # An instance has been requested.
+        pass
+
+    def lease(self, duration: float):
+        # An instance has been given back after `duration` seconds.
+        pass
+
+
+class PredictivePoolPolicy(InstancePoolPolicy):
+    # Sizes the warm pool from the forecast demand: the leases expected `lead_time` seconds ahead, plus
+    #  `headroom`, divided by the callers an instance takes (the concurrency of the balancer). Instances above it are only stopped once
+    #  keeping them has spent `idle_budget` instance-seconds, so a short dip doesn't stop them.
+
+    def __init__(self,
+                 min_warm: int = MIN_WARM_DEFAULT,
+                 max_instances: Optional[int] = None,
+                 target_spare: int = TARGET_SPARE_DEFAULT,
+                 forecast: Optional[DemandForecast] = None,
+                 lead_time: float = LEAD_TIME_DEFAULT,
+                 headroom: float = HEADROOM_DEFAULT,
+                 idle_budget: float = IDLE_BUDGET_DEFAULT
+                 ):
+        super().__init__(min_warm=min_warm, max_instances=max_instances, target_spare=target_spare)
+        self.forecast = forecast if forecast else DemandForecast()
+        self.lead_time = lead_time
+        self.headroom = headroom
+        self.idle_budget = idle_budget
+
+        self.surplus_cost = 0.0  # instance-seconds spent on instances above the forecast.
+        self.surplus_since = monotonic()
+
+    def warm(self, horizon: float) -> int:
+        return max(
+            self.min_warm,
+            ceil(self.forecast.concurrency(horizon) * (1 + self.headroom) / self.concurrency())
+        )
+
+    def deficit(self, alive: int, idle: int, launching: int) -> int:
+        needed = max(
+            super().deficit(alive=alive, idle=idle, launching=launching),
+            self.warm(self.lead_time) - (alive + launching)
+        )
+        if self.max_instances is not None:
+            needed = min(needed, max(0, self.max_instances - (alive + launching)))
+        return needed
+
+    def surplus(self, alive: int, idle: int) -> int:
+        now = monotonic()
+        elapsed, self.surplus_since = now - self.surplus_since, now
+        # Only what is not needed now nor after the lead time, and idle.
+        surplus = min(
+            idle - self.target_spare,
+            alive - max(self.warm(0), self.warm(self.lead_time))
+        )
+        if surplus <= 0:
+            self.surplus_cost = 0.0
+            return 0
+        self.surplus_cost += surplus * elapsed
+        if self.surplus_cost < self.idle_budget:
+            return 0
+        self.surplus_cost = 0.0
+        return surplus
+
+    def arrival(self):
+        self.forecast.arrival()
+
+    def lease(self, duration: float):
+        self.forecast.lease(duration)
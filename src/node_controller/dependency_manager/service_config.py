@@ -1,14 +1,25 @@
-from threading import Lock
-from typing import List, Callable, Any, Tuple, Union, Optional
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from threading import Lock, Condition
+from time import monotonic
+from typing import List, Callable, Any, Tuple, Union, Optional, Iterator, Deque
 
+import grpc
+
+from node_controller.dependency_manager.balancer import InstanceBalancer, LifoBalancer
+from node_controller.dependency_manager.health_probe import HealthProbe
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy
 from node_controller.dependency_manager.service_instance import ServiceInstance
-from node_controller.gateway.communication import generate_instance_stub, launch_instance
+from node_controller.gateway.communication import generate_instance_stub, launch_instance, launch_preamble
+from node_controller.gateway.stop_queue import StopQueue
 from node_controller.gateway.protos import gateway_pb2, celaut_pb2 as celaut
 from node_controller.utils.get_grpc_uri import get_grpc_uri, celaut_uri_to_str
 from node_controller.utils.lambdas import LOGGER, SHA3_256_ID
-from node_controller.utils.network import is_open
 from node_controller.utils.read_file import get_from_registry
 
+LAUNCH_WORKERS_DEFAULT = 8
+
 
 class ServiceConfig(object):
     def __init__(self,
@@ -24,9 +35,18 @@ class ServiceConfig(object):
                  dynamic_service_directory: str,
                  dynamic_metadata_directory: str,
                  check_if_is_alive: Optional[Callable[[], bool]]=None,
+                 pool_policy: Optional[InstancePoolPolicy] = None,
+                 max_launching: Optional[int] = None,
+                 channel_options: Optional[List[Tuple[str, Any]]] = None,
+                 compression: Optional[grpc.Compression] = None,
+                 balancer: Optional[InstanceBalancer] = None,
+                 health_probe: Optional[HealthProbe] = None,
+                 idle_ttl: Optional[float] = None,
         ):
 
         self.lock: Lock = Lock()
+        self.available: Condition = Condition(self.lock)  # Notified when an instance is added or a launch ends.
+        self.async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()  # The same, for coroutines.
 
         self.dev_client = dev_client
         self.static_service_directory = static_service_directory
@@ -42,27 +62,121 @@ class ServiceConfig(object):
                 value=bytes.fromhex(service_hash)
             )
         ]
+        # Shared by all its launches.
+        self.preamble = launch_preamble(hashes=self.hashes, config=self.config, dev_client=self.dev_client)
 
-        # Service's instances.
-        self.instances: List[ServiceInstance] = []  # A stack is used so that the 'maintainer' can detect instances that fall into disuse, as they will remain stuck at the end of the stack.
+        # Service's instances available to a caller. The balancer decides which one a caller takes,
+        #  and keeps the least recently used ones where the 'maintainer' can detect them.
+        self.instances: InstanceBalancer = balancer if balancer is not None else LifoBalancer()
 
 
         self.check_if_is_alive = check_if_is_alive
+        self.health_probe: HealthProbe = health_probe if health_probe else HealthProbe()  # If check_if_is_alive isn't given.
         self.timeout = timeout
         self.failed_attempts = failed_attempts
         self.pass_timeout_times = pass_timeout_times
 
         self.dynamic = dynamic  # Dynamic if is acquired by the api
 
+        # Options of the channels to the instances, see communication.channel_options.
+        self.channel_options = channel_options
+        self.compression = compression
+
+        # Warm pool. alive counts the launched instances not stopped yet, taken or not.
+        self.pool_policy: InstancePoolPolicy = pool_policy if pool_policy else InstancePoolPolicy()
+        self.pool_policy.concurrency = lambda: self.instances.concurrency
+        self.alive: int = 0
+        self.launching: int = 0
+        self.max_launching: Optional[int] = max_launching  # Cap of concurrent launches, None is unbounded.
+        self.refill: Callable[[], None] = lambda: None  # Set by the DependencyManager to wake its filler.
+
+        # Seconds an instance can stay unused before it is stopped (None keeps it), unless the warm pool needs it.
+        self.idle_ttl: Optional[float] = idle_ttl
+        self.on_idle: Callable[[ServiceInstance], None] = lambda instance: None  # Set by the DependencyManager.
+        self.stop_queue: Optional[StopQueue] = None  # Set by the DependencyManager, stops are synchronous without it.
+
+    # Launch bookkeeping. Must be called with the lock held.
+
+    def launch_deficit(self) -> int:
+        # Reserves the launches it returns.
+        deficit = self.pool_policy.deficit(
+            alive=self.alive,
+            idle=len(self.instances),
+            launching=self.launching
+        )
+        if self.max_launching is not None:
+            deficit = min(deficit, max(0, self.max_launching - self.launching))
+        self.launching += deficit
+        return deficit
+
+    def can_launch(self) -> bool:
+        return (self.max_launching is None or self.launching < self.max_launching) and \
+            (self.pool_policy.max_instances is None
+             or self.alive + self.launching < self.pool_policy.max_instances)
+
+    def end_launch(self, instance: Optional[ServiceInstance] = None):
+        # Releases a reserved launch. The instance, if any, goes to the queue.
+        self.launching -= 1
+        if instance:
+            self.add_instance(instance)
+        else:
+            self.notify_available()
+
+    def retire_surplus(self) -> List[ServiceInstance]:
+        # Takes out the idle instances the pool policy doesn't need anymore, to be stopped by the caller
+        #  with counted=False: they aren't alive from now, so a later call doesn't retire them twice.
+        surplus = []
+        for _ in range(self.pool_policy.surplus(alive=self.alive, idle=len(self.instances))):
+            try:
+                surplus.append(self.instances.take_idle())
+            except IndexError:
+                break
+        self.alive -= len(surplus)
+        return surplus
+
+    def notify_available(self):
+        # Wakes a waiting thread and a waiting coroutine, both check again for an instance.
+        self.available.notify()
+        while self.async_waiters:
+            loop, future = self.async_waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+                break
+
+    def wait_available(self) -> asyncio.Future:
+        # Future resolved by the next notify_available(), on the running loop.
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.async_waiters.append((loop, future))
+        return future
+
     def add_instance(self, instance: ServiceInstance, deep=False):
         LOGGER('Add instance ' + str(instance))
-        self.instances.append(instance) if not deep else self.instances.insert(0, instance)
+        self.instances.add(instance, deep=deep)
+        self.notify_available()
+        if instance.in_flight == 0:
+            self.on_idle(instance)
+
+    def return_instance(self, instance: ServiceInstance, zombie: bool = False) -> bool:
+        # A caller gives back an instance taken with get_instance(). Returns True if it has to be stopped:
+        #  a zombie is retired at once, but stopped only when its last caller returns it.
+        instance.in_flight -= 1
+        if zombie and not instance.retired:
+            instance.retired = True
+            self.instances.discard(instance)
+        self.pool_policy.lease(monotonic() - instance.used_at)
+        if instance.retired:
+            return instance.in_flight == 0
+        instance.mark_time()
+        self.add_instance(instance)
+        return False
 
     def get_instance(self, deep=False) -> ServiceInstance:
+        # deep is used by the maintainer, it takes the least recently used instance without callers.
         LOGGER('Get an instance of. deep ' + str(deep))
         LOGGER('The service ' + self.hashes[0].value.hex() + ' has ' + str(len(self.instances)) + ' instances.')
         try:
-            return self.instances.pop() if not deep else self.instances.pop(0)
+            return self.instances.take() if not deep else self.instances.take_idle()
         except IndexError:
             LOGGER('    list empty --> ' + str(self.instances))
             raise IndexError
@@ -78,7 +192,8 @@ class ServiceConfig(object):
             dynamic_service_directory=self.dynamic_service_directory,
             dynamic_metadata_directory=self.dynamic_metadata_directory,
             dynamic=self.dynamic,
-            dev_client=self.dev_client
+            dev_client=self.dev_client,
+            preamble=self.preamble
         )
 
         try:
@@ -88,13 +203,72 @@ class ServiceConfig(object):
             raise e
         LOGGER('The uri for the service ' + self.service_hash + ' is--> ' + str(uri))
 
-        return ServiceInstance(
+        with self.lock:
+            self.alive += 1
+        service_instance = ServiceInstance(
             uri=f"{uri.ip}:{str(uri.port)}",
             token=instance.token,
-            check_if_is_alive=self.check_if_is_alive
-            if self.check_if_is_alive
-            else lambda timeout: is_open(timeout=timeout, ip=uri.ip, port=uri.port)
+            check_if_is_alive=self.check_if_is_alive,
+            channel_options=self.channel_options,
+            compression=self.compression
         )
+        if not self.check_if_is_alive:
+            service_instance.check_if_is_alive = self.health_probe.bind(service_instance)
+        return service_instance
+
+    def launch_instances(self, gateway_stub, n: int, max_workers: int = LAUNCH_WORKERS_DEFAULT) \
+            -> Iterator[ServiceInstance]:
+        # Launches n instances concurrently, yielding each one as soon as it is ready.
+        #  The failed launches are logged and skipped, so fewer than n may be yielded.
+        #  If the caller stops iterating, the launches not started are cancelled and the others are stopped.
+        if n <= 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(n, max_workers), thread_name_prefix='ServiceLauncher')
+        futures = [executor.submit(self.launch_instance, gateway_stub) for _ in range(n)]
+        pending = set(futures)
+        try:
+            for future in as_completed(futures):
+                pending.discard(future)
+                try:
+                    instance = future.result()
+                except Exception as e:
+                    LOGGER('ERROR launching an instance of ' + self.service_hash + ', ' + str(e))
+                    continue
+                yield instance
+        finally:
+            for future in pending:
+                if not future.cancel():
+                    future.add_done_callback(lambda f: self.__abandoned(f, gateway_stub))
+            executor.shutdown(wait=False)
+
+    def __abandoned(self, future: Future, gateway_stub):
+        # Launched for a caller that doesn't want it anymore.
+        if not future.exception():
+            LOGGER('      abandoned instance --> ' + str(future.result()))
+            self.stop_instance(instance=future.result(), gateway_stub=gateway_stub)
+
+    def stop_instance(self, instance: ServiceInstance, gateway_stub, counted: bool = True) -> Future:
+        # Not alive anymore from now, so the warm pool accounts for it while it is being stopped.
+        #  With a stop queue the stop runs in the background, the returned future reports it.
+        if counted:
+            with self.lock:
+                self.alive -= 1
+        if self.stop_queue:
+            future = instance.stop_later(self.stop_queue)
+        else:
+            future = Future()
+            try:
+                instance.stop(gateway_stub)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+        future.add_done_callback(lambda f: self.__stopped(instance, f))
+        return future
+
+    def __stopped(self, instance: ServiceInstance, future: Future):
+        if future.exception():
+            LOGGER('ERROR stopping the instance ' + str(instance.token) + ', ' + str(future.exception()))
+        self.refill()
 
     def get_service_with_config(self, mem_manager: Callable[[int], Any]) \
             -> Tuple[
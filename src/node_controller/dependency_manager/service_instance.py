@@ -1,27 +1,65 @@
 # If an instance is taken, it must be ensured that it is either added to its corresponding queue or stopped. 
 # Not ensuring this causes a significant bug, as the instances would remain as zombies on the network until the service is removed.
+from concurrent.futures import Future
 from datetime import datetime
-from time import sleep
+from threading import Lock
+from time import sleep, monotonic
+from typing import Optional, List, Tuple, Any, Dict
 
 import grpc
 
-from node_controller.gateway.communication import stop
+from node_controller.gateway.communication import stop, generate_instance_channel
+from node_controller.gateway.stop_queue import StopQueue
+
+LATENCY_EWMA_ALPHA = 0.3
 
 
 class ServiceInstance(object):
-    def __init__(self, uri: str, token, check_if_is_alive):
+    def __init__(self, uri: str, token, check_if_is_alive,
+                 channel_options: Optional[List[Tuple[str, Any]]] = None,
+                 compression: Optional[grpc.Compression] = None):
         self.uri = uri
         self.token = token
         self.creation_datetime = datetime.now()
         self.use_datetime = datetime.now()
+        self.used_at = monotonic()  # Same as use_datetime, for the idle deadlines.
         self.pass_timeout = 0
         self.failed_attempts = 0
         self.check_if_is_alive = check_if_is_alive
 
+        # Use statistics, recorded by the leases.
+        self.uses = 0
+        self.outcomes = {}
+        self.last_latency = None
+        self.latency_ewma = None
+
+        # Balancer bookkeeping, see balancer.InstanceBalancer. Only touched with the ServiceConfig lock held.
+        self.in_flight = 0  # Callers using it.
+        self.balanced = False  # In the balancer, available to one more caller.
+        self.balancer_index = 0
+        self.retired = False  # Zombie waiting for its last caller to be stopped.
+        self.expiry_scheduled = False  # In the heap of idle_expiry.IdleExpiry.
+
+        # Last health probe, see health_probe.HealthProbe.
+        self.probed_at: Optional[float] = None
+        self.probe_result = True
+        self.health_implemented = True  # Whether it answers grpc.health.v1, else only its channel is checked.
+
+        # Channel to the instance, created on first use and kept until the instance is stopped.
+        self.channel_options = channel_options
+        self.compression = compression
+        self.channel: Optional[grpc.Channel] = None
+        self.stubs: Dict[type, Any] = {}
+        self.channel_lock = Lock()
+
     def error(self):
         sleep(1)  # Wait if the service is loading.
         self.failed_attempts = self.failed_attempts + 1
 
+    def suspect(self, pass_timeout_times, failed_attempts) -> bool:
+        # Only a suspect instance can be a zombie, the others don't need to be checked.
+        return self.pass_timeout > pass_timeout_times or self.failed_attempts > failed_attempts
+
     def is_zombie(self,
                   pass_timeout_times,
                   timeout,
@@ -42,13 +80,50 @@ class ServiceInstance(object):
 
     def mark_time(self):
         self.use_datetime = datetime.now()
+        self.used_at = monotonic()
+
+    def record(self, latency: float, outcome: str):
+        self.uses += 1
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.last_latency = latency
+        self.latency_ewma = latency if self.latency_ewma is None \
+            else LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+
+    def get_channel(self) -> grpc.Channel:
+        with self.channel_lock:
+            if not self.channel:
+                self.channel = generate_instance_channel(
+                    uri=self.uri,
+                    options=self.channel_options,
+                    compression=self.compression
+                )
+            return self.channel
+
+    def stub(self, stub_class):
+        # The stub of stub_class over the instance channel, reused between calls.
+        stub = self.stubs.get(stub_class)
+        if not stub:
+            stub = self.stubs.setdefault(stub_class, stub_class(self.get_channel()))
+        return stub
+
+    def close(self):
+        with self.channel_lock:
+            if self.channel:
+                self.channel.close()
+            self.channel = None
+            self.stubs = {}
 
     def stop(self, gateway_stub):
+        self.close()
         stop(gateway_stub=gateway_stub, token=self.token)
 
+    def stop_later(self, stop_queue: StopQueue) -> Future:
+        self.close()
+        return stop_queue.submit(self.token)
+
     def compute_exception(self, e: Exception) -> str:
         # https://github.com/avinassh/grpc-errors/blob/master/python/client.py
-        if type(e) == grpc.RpcError and int(e.code().value[0]) == 4:
+        if isinstance(e, grpc.RpcError) and int(e.code().value[0]) == 4:
             self.timeout_passed()
             return 'timeout'
 
@@ -1,3 +1,10 @@
+import asyncio
+from concurrent.futures import Future
+from threading import Thread
+from time import monotonic
+from typing import Optional, Tuple
+
+from node_controller.dependency_manager.instance_lease import InstanceLease
 from node_controller.dependency_manager.service_instance import ServiceInstance
 
 from node_controller.dependency_manager.service_config import ServiceConfig
@@ -12,39 +19,128 @@ class ServiceInterface:
         self.gateway_stub = gateway_stub
         self.sc: ServiceConfig = service_with_config
 
-    def get_instance(self) -> ServiceInstance:
-        self.sc.lock.acquire()
-
+    def __take(self) -> Tuple[Optional[ServiceInstance], bool]:
+        # Must be called with the lock held. -> (a queued instance, or whether a launch has been reserved).
         try:
-            instance: ServiceInstance = self.sc.get_instance()
-            self.sc.lock.release()
-
+            return self.sc.get_instance(), False
         except IndexError:
-            self.sc.lock.release()
-            instance: ServiceInstance = self.sc.launch_instance(
+            pass
+        if self.sc.can_launch():
+            self.sc.launching += 1
+            return None, True
+        return None, False
+
+    def __launch(self) -> ServiceInstance:
+        # Launches on a reserved launch.
+        try:
+            instance = self.sc.launch_instance(
                 self.gateway_stub
             )
+        finally:
+            with self.sc.lock:
+                self.sc.end_launch()
+        with self.sc.lock:
+            # Shared with other callers if the balancer allows more than one.
+            instance.in_flight = 1
+            self.sc.add_instance(instance)
+        return instance
+
+    async def __alaunch(self) -> ServiceInstance:
+        # __launch on a thread. If the caller is cancelled meanwhile, the launch goes on and the instance
+        #  is given back once launched, else it would stay taken forever.
+        launched = Future()
+        launched.set_running_or_notify_cancel()  # The waiter can't cancel it.
+
+        def launch():
+            try:
+                launched.set_result(self.__launch())
+            except BaseException as e:
+                launched.set_exception(e)
+
+        Thread(target=launch, name='ServiceLauncher').start()
+        try:
+            return await asyncio.wrap_future(launched)
+        except asyncio.CancelledError:
+            launched.add_done_callback(lambda f: f.exception() or self.push_instance(f.result()))
+            raise
 
+    def __taken(self, instance: ServiceInstance) -> ServiceInstance:
         instance.mark_time()
+        self.sc.refill()
         return instance
 
+    def __timeout(self) -> TimeoutError:
+        return TimeoutError("No instance of " + self.sc.service_hash + " available.")
+
+    def get_instance(self, timeout: Optional[float] = None) -> ServiceInstance:
+        # Takes a queued instance or launches a new one. When the service is already launching as many
+        #  instances as it is allowed, waits (up to timeout seconds) for an instance to be returned.
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self.sc.lock:
+            self.sc.pool_policy.arrival()
+            while True:
+                instance, launch = self.__take()
+                if instance or launch:
+                    break
+                remaining = deadline - monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise self.__timeout()
+                self.sc.available.wait(timeout=remaining)
+
+        return self.__taken(instance if instance else self.__launch())
+
+    def instance(self, timeout: Optional[float] = None) -> InstanceLease:
+        # with service_interface.instance() as instance: ...
+        return InstanceLease(service_interface=self, timeout=timeout)
+
+    async def aget_instance(self, timeout: Optional[float] = None) -> ServiceInstance:
+        # Like get_instance, but the wait is a future resolved when an instance is added or a launch ends,
+        #  so waiting coroutines don't hold threads. Only the launch, a blocking gRPC stream, runs on one.
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self.sc.lock:
+            self.sc.pool_policy.arrival()
+        while True:
+            with self.sc.lock:
+                instance, launch = self.__take()
+                if instance or launch:
+                    break
+                future = self.sc.wait_available()
+
+            remaining = deadline - monotonic() if deadline is not None else None
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError
+                async with asyncio.timeout(remaining):
+                    await future
+            except BaseException as e:
+                with self.sc.lock:
+                    if future.done() and not future.cancelled():
+                        # Woken, pass it on to another waiter.
+                        self.sc.notify_available()
+                    else:
+                        future.cancel()
+                if isinstance(e, TimeoutError):
+                    raise self.__timeout()
+                raise
+
+        if launch:
+            instance = await self.__alaunch()
+        return self.__taken(instance)
+
     def push_instance(self, instance: ServiceInstance):
 
         # Si la instancia se encuentra en estado zombie
         # la detiene, en caso contrario la introduce
         #  de nuevo en su cola correspondiente.
-        if instance.is_zombie(
-                pass_timeout_times=self.sc.pass_timeout_times,
-                timeout=self.sc.timeout,
-                failed_attempts=self.sc.failed_attempts
-        ):
-            instance.stop(
-                self.gateway_stub
-            )
-
-        else:
-            self.sc.lock.acquire()
-            self.sc.add_instance(
-                instance=instance
+        zombie = instance.is_zombie(
+            pass_timeout_times=self.sc.pass_timeout_times,
+            timeout=self.sc.timeout,
+            failed_attempts=self.sc.failed_attempts
+        )
+        with self.sc.lock:
+            must_stop = self.sc.return_instance(instance=instance, zombie=zombie)
+        if must_stop:
+            self.sc.stop_instance(
+                instance=instance,
+                gateway_stub=self.gateway_stub
             )
-            self.sc.lock.release()
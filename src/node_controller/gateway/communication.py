@@ -1,57 +1,98 @@
-from time import sleep
 import os
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Any, Callable
 
 from grpcbigbuffer.client import Dir, client_grpc
 import grpc
 
-from node_controller.gateway.protos import gateway_pb2, gateway_pb2_grpc, celaut_pb2
+from node_controller.gateway.connection import GatewayConnectionManager, GatewayConnection
+from node_controller.gateway.extraction import wait_extracted
+from node_controller.gateway.protos import gateway_pb2, celaut_pb2
 from node_controller.gateway.protos.gateway_pb2_grpcbf import StartService_input_indices
+from node_controller.gateway.retry import RetryPolicy
 from node_controller.gateway.utils import from_gas_amount, to_gas_amount
 from node_controller.utils.lambdas import LOGGER
 
+LAUNCH_RETRY_POLICY = RetryPolicy(deadline=600)  # seconds, it includes the upload of the service.
+STOP_RETRY_POLICY = RetryPolicy(deadline=30)
+CALL_RETRY_POLICY = RetryPolicy(deadline=30, attempts=3)
+SERVICE_MISSING_CODES = (grpc.StatusCode.NOT_FOUND,)  # A launch by hash of a service the node doesn't have.
 
-def generate_gateway_stub(node_url: str) -> gateway_pb2_grpc.GatewayStub:
-    return gateway_pb2_grpc.GatewayStub(
-        grpc.insecure_channel(node_url)
-    )
 
+def generate_gateway_stub(node_url: str) -> GatewayConnection:
+    # The shared connection of the process, usable as a GatewayStub.
+    return GatewayConnectionManager().connection(node_url)
 
-def generate_instance_stub(stub_class, uri: str):
-    return stub_class(grpc.insecure_channel(uri))
 
+def channel_options(keepalive_time_ms: Optional[int] = None,
+                    keepalive_timeout_ms: Optional[int] = None,
+                    max_message_length: Optional[int] = None
+                    ) -> List[Tuple[str, Any]]:
+    options = []
+    if keepalive_time_ms is not None:
+        options.append(('grpc.keepalive_time_ms', keepalive_time_ms))
+        options.append(('grpc.keepalive_permit_without_calls', 1))
+    if keepalive_timeout_ms is not None:
+        options.append(('grpc.keepalive_timeout_ms', keepalive_timeout_ms))
+    if max_message_length is not None:
+        options.append(('grpc.max_send_message_length', max_message_length))
+        options.append(('grpc.max_receive_message_length', max_message_length))
+    return options
 
-def __service_extended(
+
+def generate_instance_channel(uri: str,
+                              options: Optional[List[Tuple[str, Any]]] = None,
+                              compression: Optional[grpc.Compression] = None
+                              ) -> grpc.Channel:
+    return grpc.insecure_channel(uri, options=options, compression=compression)
+
+
+def generate_instance_stub(stub_class, uri: str,
+                           options: Optional[List[Tuple[str, Any]]] = None,
+                           compression: Optional[grpc.Compression] = None):
+    return stub_class(generate_instance_channel(uri=uri, options=options, compression=compression))
+
+
+def launch_preamble(
         hashes: List[celaut_pb2.Any.Metadata.HashTag.Hash],
         config: celaut_pb2.Configuration,
+        dev_client: Optional[str]
+) -> List[Any]:
+    # The first messages of a StartService stream, the same for every launch of a service.
+    preamble = []
+    if dev_client:
+        preamble.append(gateway_pb2.Client(client_id=dev_client))
+
+    preamble.append(gateway_pb2.Configuration(
+        config=config,
+        resources=gateway_pb2.CombinationResources(clause={
+            1: gateway_pb2.CombinationResources.Clause(
+                min_sysreq=celaut_pb2.Sysresources(
+                    mem_limit=7 * pow(10, 6)
+                )
+            )
+        }),
+        initial_gas_amount=to_gas_amount(10000)
+    ))
+    preamble.extend(hashes)
+    return preamble
+
+
+def __service_extended(
+        preamble: List[Any],
         service_hash: str,
         service_directory: str,
         metadata_directory: str,
         dynamic: bool,
-        dev_client: str
+        upload: bool = True
 ):
-    if dev_client:
-        yield gateway_pb2.Client(client_id=dev_client)
-
-    yield gateway_pb2.Configuration(
-                config=config,
-                resources=gateway_pb2.CombinationResources(clause={
-                    1: gateway_pb2.CombinationResources.Clause(
-                        min_sysreq=celaut_pb2.Sysresources(
-                            mem_limit=7 * pow(10, 6)
-                        )
-                    )
-                }),
-                initial_gas_amount=to_gas_amount(10000)
-            )
+    yield from preamble
 
-    for _hash in hashes:
-        yield _hash
+    if not upload:
+        # The node already has it.
+        return
 
-    # TODO could use async here.
-    while not dynamic and os.path.isfile(os.path.join(service_directory, 'services.zip')):
-        sleep(1)
-        continue
+    if not dynamic:
+        wait_extracted(service_directory)
 
     if os.path.exists(os.path.join(metadata_directory, service_hash)):
         yield Dir(dir=os.path.join(metadata_directory, service_hash), _type=celaut_pb2.Any.Metadata)
@@ -68,56 +109,99 @@ def launch_instance(gateway_stub,
                     dynamic_metadata_directory: str,
                     dynamic: bool,
                     dev_client,
+                    preamble: Optional[List[Any]] = None,
+                    retry_policy: RetryPolicy = LAUNCH_RETRY_POLICY
                     ) -> gateway_pb2.Instance:
     LOGGER('    launching new instance for service ' + service_hash)
-    while True:
+    if preamble is None:
+        preamble = launch_preamble(hashes=hashes, config=config, dev_client=dev_client)
+    known = isinstance(gateway_stub, GatewayConnection) and gateway_stub.has_service(service_hash)
+
+    def start(upload: bool, timeout: Optional[float]) -> gateway_pb2.Instance:
+        return next(client_grpc(
+            method=gateway_stub.StartService,
+            input=__service_extended(
+                preamble=preamble,
+                service_hash=service_hash,
+                service_directory=dynamic_service_directory if dynamic else static_service_directory,
+                metadata_directory=dynamic_metadata_directory if dynamic else static_metadata_directory,
+                dynamic=dynamic,
+                upload=upload
+            ),
+            indices_parser=gateway_pb2.Instance,
+            partitions_message_mode_parser=True,
+            indices_serializer=StartService_input_indices,
+            timeout=timeout
+        ))
+
+    def attempt(timeout: Optional[float]) -> gateway_pb2.Instance:
+        nonlocal known
+        if not known:
+            return start(upload=True, timeout=timeout)
         try:
-            instance: gateway_pb2.Instance = next(client_grpc(
-                method=gateway_stub.StartService,
-                input=__service_extended(
-                    hashes=hashes,
-                    config=config,
-                    service_hash=service_hash,
-                    service_directory=dynamic_service_directory if dynamic else static_service_directory,
-                    metadata_directory=dynamic_metadata_directory if dynamic else static_metadata_directory,
-                    dynamic=dynamic,
-                    dev_client=dev_client
-                ),
-                indices_parser=gateway_pb2.Instance,
-                partitions_message_mode_parser=True,
-                indices_serializer=StartService_input_indices,
-            ))
-            break
+            return start(upload=False, timeout=timeout)
         except grpc.RpcError as e:
-            LOGGER('GRPC ERROR LAUNCHING INSTANCE. ' + str(e))
-            sleep(1)
-
+            # The node may have lost it, upload it again. Other errors go to the retry policy.
+            if e.code() not in SERVICE_MISSING_CODES:
+                raise e
+            LOGGER('The node does not have the service ' + service_hash + ', uploading it. ' + str(e))
+            gateway_stub.service_missing(service_hash)
+            known = False
+            return start(upload=True, timeout=timeout)
+
+    instance: gateway_pb2.Instance = retry_policy.call(attempt, gateway_stub=gateway_stub)
+    if isinstance(gateway_stub, GatewayConnection):
+        gateway_stub.service_received(service_hash)
     return instance
 
 
-def stop(gateway_stub, token: str):
+def stop(gateway_stub, token: str, retry_policy: RetryPolicy = STOP_RETRY_POLICY):
     LOGGER('Stops this instance with token ' + str(token))
-    while True:
-        try:
-            next(client_grpc(
-                method=gateway_stub.StopService,
-                input=gateway_pb2.TokenMessage(
-                    token=token
-                ),
-                indices_serializer=gateway_pb2.TokenMessage
-            ))
-            break
-        except grpc.RpcError as e:
-            LOGGER('GRPC ERROR STOPPING SOLVER ' + str(e))
-            sleep(1)
+    retry_policy.call(
+        lambda timeout: next(client_grpc(
+            method=gateway_stub.StopService,
+            input=gateway_pb2.TokenMessage(
+                token=token
+            ),
+            indices_serializer=gateway_pb2.TokenMessage,
+            timeout=timeout
+        )),
+        gateway_stub=gateway_stub
+    )
 
 
-def modify_resources(i: dict, node_url: str) -> Tuple[celaut_pb2.Sysresources, int]:
-    output: gateway_pb2.ModifyServiceSystemResourcesOutput = next(
-        client_grpc(
-            method=gateway_pb2_grpc.GatewayStub(
-                grpc.insecure_channel(node_url)
-            ).ModifyServiceSystemResources,
+def stop_batch(gateway_stub, tokens: List[str], retry_policy: RetryPolicy = STOP_RETRY_POLICY,
+               stopped: Optional[Callable[[str], None]] = None) -> int:
+    # Stops several instances over one StopService stream, which answers a Refund per token, in order.
+    #  Returns how many of the tokens (the first ones) have been stopped; stopped(token) is called as each
+    #  one is answered, even if the stream fails later. A retry only sends the tokens not answered yet.
+    LOGGER('Stops the instances with tokens ' + str(tokens))
+    answered = 0
+
+    def attempt(timeout: Optional[float]) -> int:
+        nonlocal answered
+        for _ in client_grpc(
+                method=gateway_stub.StopService,
+                input=(gateway_pb2.TokenMessage(token=token) for token in tokens[answered:]),
+                indices_serializer=gateway_pb2.TokenMessage,
+                partitions_message_mode_parser=True,
+                indices_parser=gateway_pb2.Refund,
+                timeout=timeout
+        ):
+            if stopped:
+                stopped(tokens[answered])
+            answered += 1
+        return answered
+
+    return retry_policy.call(attempt, gateway_stub=gateway_stub)
+
+
+def modify_resources(i: dict, node_url: str, retry_policy: RetryPolicy = CALL_RETRY_POLICY) \
+        -> Tuple[celaut_pb2.Sysresources, int]:
+    gateway_stub = generate_gateway_stub(node_url)
+    output: gateway_pb2.ModifyServiceSystemResourcesOutput = retry_policy.call(
+        lambda timeout: next(client_grpc(
+            method=gateway_stub.ModifyServiceSystemResources,
             input=gateway_pb2.ModifyServiceSystemResourcesInput(
                 min_sysreq=celaut_pb2.Sysresources(
                     mem_limit=i['min']
@@ -128,6 +212,26 @@ def modify_resources(i: dict, node_url: str) -> Tuple[celaut_pb2.Sysresources, i
             ),
             partitions_message_mode_parser=True,
             indices_parser=gateway_pb2.ModifyServiceSystemResourcesOutput,
-        )
+            timeout=timeout
+        )),
+        gateway_stub=gateway_stub
     )
     return output.sysreq, from_gas_amount(output.gas)
+
+
+def get_metrics(gateway_stub, token: str, retry_policy: RetryPolicy = CALL_RETRY_POLICY) -> int:
+    # Gas of the instance with this token.
+    metrics: gateway_pb2.Metrics = retry_policy.call(
+        lambda timeout: next(client_grpc(
+            method=gateway_stub.GetMetrics,
+            input=gateway_pb2.TokenMessage(
+                token=token
+            ),
+            indices_serializer=gateway_pb2.TokenMessage,
+            partitions_message_mode_parser=True,
+            indices_parser=gateway_pb2.Metrics,
+            timeout=timeout
+        )),
+        gateway_stub=gateway_stub
+    )
+    return from_gas_amount(metrics.gas_amount)
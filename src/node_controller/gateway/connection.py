@@ -0,0 +1,194 @@
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Set
+
+import grpc
+
+from node_controller.gateway.protos import gateway_pb2_grpc
+from node_controller.utils.lambdas import LOGGER
+from node_controller.utils.singleton import Singleton
+
+RECONNECT_BACKOFF_MIN = 0.5  # seconds.
+RECONNECT_BACKOFF_MAX = 30
+BREAKER_FAILURES = 5  # Consecutive failures that open the circuit.
+BREAKER_RESET = 30  # seconds open before a trial call is let through.
+BREAKER_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+GATEWAY_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.initial_reconnect_backoff_ms', int(RECONNECT_BACKOFF_MIN * 1000)),
+    ('grpc.max_reconnect_backoff_ms', int(RECONNECT_BACKOFF_MAX * 1000)),
+]
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    # Closed until `failures` consecutive failures. Then open, failing the calls at once, for `reset` seconds.
+    #  Then half open: a single trial call goes through and its result closes or opens it again.
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset: float = BREAKER_RESET):
+        self.threshold = failures
+        self.reset = reset
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.trial or monotonic() - self.opened_at < self.reset:
+                raise CircuitOpenError("The gateway circuit is open.")
+            self.trial = True
+
+    def success(self):
+        with self.lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at, self.trial = monotonic(), False
+
+    def release(self):
+        # The trial call ended without telling anything about the gateway.
+        with self.lock:
+            self.trial = False
+
+
+class GatewayConnection(object):
+    # A single channel to a node gateway, used as a GatewayStub: the RPC attributes are taken from the
+    #  stub of the current channel. The channel state is watched, and on an UNAVAILABLE error while it
+    #  is in TRANSIENT_FAILURE or SHUTDOWN the channel is replaced, waiting an exponential backoff between
+    #  replacements. A replaced channel is closed once the calls on it end (the calls made through
+    #  retry.RetryPolicy are counted, see begin() and end()).
+    #  Its circuit breaker is shared by every call to the node, see retry.RetryPolicy.
+
+    def __init__(self, node_url: str):
+        self.node_url = node_url
+        self.lock = Lock()
+        self.channel: Optional[grpc.Channel] = None
+        self.stub: Optional[gateway_pb2_grpc.GatewayStub] = None
+        self.state: Optional[grpc.ChannelConnectivity] = None
+        self.active: Dict[grpc.Channel, int] = {}  # Calls on each channel, the replaced ones included.
+
+        self.backoff = RECONNECT_BACKOFF_MIN
+        self.next_reconnect: float = 0
+
+        self.breaker = CircuitBreaker()
+
+        # Services whose bytes the node has already received, so their launches only send the hashes.
+        self.services: Set[str] = set()
+
+    def __connect(self):
+        # Must be called with the lock held.
+        self.__retire()
+        LOGGER('Connecting to the gateway ' + self.node_url)
+        self.channel = grpc.insecure_channel(self.node_url, options=GATEWAY_CHANNEL_OPTIONS)
+        self.channel.subscribe(self.__on_state, try_to_connect=True)
+        self.stub = gateway_pb2_grpc.GatewayStub(self.channel)
+
+    def __retire(self):
+        # Must be called with the lock held. Closing a channel cancels its calls, so it waits for them.
+        if self.channel:
+            self.channel.unsubscribe(self.__on_state)
+            if self.channel not in self.active:
+                self.channel.close()
+        self.channel, self.stub, self.state = None, None, None
+
+    def __on_state(self, state: grpc.ChannelConnectivity):
+        self.state = state
+        if state == grpc.ChannelConnectivity.READY:
+            self.backoff = RECONNECT_BACKOFF_MIN
+
+    def __stub(self) -> gateway_pb2_grpc.GatewayStub:
+        # Must be called with the lock held.
+        if not self.stub or self.state == grpc.ChannelConnectivity.SHUTDOWN:
+            self.__connect()
+        return self.stub
+
+    def get_stub(self) -> gateway_pb2_grpc.GatewayStub:
+        with self.lock:
+            return self.__stub()
+
+    def healthy(self) -> bool:
+        # False once the channel fails to connect or is shut down, then it is worth replacing.
+        return self.state not in (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+    def begin(self) -> grpc.Channel:
+        # A call starts on the current channel, it isn't closed until end() is called with it.
+        with self.lock:
+            self.__stub()
+            self.active[self.channel] = self.active.get(self.channel, 0) + 1
+            return self.channel
+
+    def end(self, channel: grpc.Channel):
+        with self.lock:
+            self.active[channel] -= 1
+            if self.active[channel] > 0:
+                return
+            del self.active[channel]
+            if channel is not self.channel:
+                channel.close()
+
+    def report_success(self):
+        self.breaker.success()
+
+    def report_failure(self, e: Exception):
+        if not isinstance(e, grpc.RpcError):
+            return
+        if e.code() not in BREAKER_CODES:
+            # The gateway answered.
+            self.breaker.success()
+            return
+        self.breaker.failure()
+        if e.code() != grpc.StatusCode.UNAVAILABLE:
+            return
+        with self.lock:
+            now = monotonic()
+            if self.channel and not self.healthy() and now >= self.next_reconnect:
+                self.__connect()
+                self.next_reconnect = now + self.backoff
+                self.backoff = min(self.backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def has_service(self, service_hash: str) -> bool:
+        return service_hash in self.services
+
+    def service_received(self, service_hash: str):
+        self.services.add(service_hash)
+
+    def service_missing(self, service_hash: str):
+        self.services.discard(service_hash)
+
+    def close(self):
+        with self.lock:
+            self.__retire()
+
+    def __getattr__(self, name: str):
+        # StartService, StopService, ModifyServiceSystemResources, GetMetrics ...
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_stub(), name)
+
+
+class GatewayConnectionManager(metaclass=Singleton):
+    # One GatewayConnection per node url for the whole process.
+
+    def __init__(self):
+        self.lock = Lock()
+        self.connections: Dict[str, GatewayConnection] = {}
+
+    def connection(self, node_url: str) -> GatewayConnection:
+        with self.lock:
+            if node_url not in self.connections:
+                self.connections[node_url] = GatewayConnection(node_url=node_url)
+            return self.connections[node_url]
@@ -0,0 +1,25 @@
+import os
+from time import monotonic, sleep
+from typing import Optional
+
+SERVICES_ZIP = 'services.zip'
+POLL_BACKOFF_MIN = 0.01  # seconds.
+POLL_BACKOFF_MAX = 0.25
+
+
+def _pending(service_directory: str) -> bool:
+    return os.path.isfile(os.path.join(service_directory, SERVICES_ZIP))
+
+
+def wait_extracted(service_directory: str, timeout: Optional[float] = None) -> bool:
+    # Waits until the services.zip of a directory has been extracted (the file is removed), by another
+    #  process, polling with a short exponential backoff. False if it is still there after timeout seconds.
+    deadline = monotonic() + timeout if timeout is not None else None
+    backoff = POLL_BACKOFF_MIN
+    while _pending(service_directory):
+        wait = backoff if deadline is None else min(backoff, deadline - monotonic())
+        if wait <= 0:
+            return False
+        sleep(wait)
+        backoff = min(backoff * 2, POLL_BACKOFF_MAX)
+    return True
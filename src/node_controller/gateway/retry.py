@@ -0,0 +1,71 @@
+import random
+from time import sleep
+from typing import Callable, Optional, TypeVar
+
+import grpc
+
+from node_controller.gateway.connection import GatewayConnection
+from node_controller.utils.lambdas import LOGGER
+
+RETRY_ATTEMPTS_DEFAULT = 5
+RETRY_BACKOFF_MIN = 0.5  # seconds.
+RETRY_BACKOFF_MAX = 30
+RETRYABLE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+)
+
+T = TypeVar('T')
+
+
+class RetryPolicy(object):
+    # Calls to a gateway with a deadline per attempt (None is unbounded), at most `attempts` attempts and
+    #  an exponential backoff with full jitter between them. Only transient errors are retried.
+    # With a GatewayConnection, each result is reported to it and its circuit breaker is honored.
+
+    def __init__(self,
+                 deadline: Optional[float],
+                 attempts: int = RETRY_ATTEMPTS_DEFAULT,
+                 backoff_min: float = RETRY_BACKOFF_MIN,
+                 backoff_max: float = RETRY_BACKOFF_MAX
+                 ):
+        self.deadline = deadline
+        self.attempts = attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_min * pow(2, attempt)))
+
+    def call(self, fn: Callable[[Optional[float]], T], gateway_stub=None) -> T:
+        # fn(timeout) makes one attempt.
+        connection = gateway_stub if isinstance(gateway_stub, GatewayConnection) else None
+        for attempt in range(self.attempts):
+            if connection:
+                connection.breaker.allow()
+                channel = connection.begin()
+            try:
+                result = fn(self.deadline)
+            except grpc.RpcError as e:
+                if connection:
+                    connection.end(channel)
+                    connection.report_failure(e)
+                if attempt + 1 >= self.attempts or e.code() not in RETRYABLE_CODES:
+                    raise e
+                delay = self.delay(attempt)
+                LOGGER('GRPC ERROR, retrying in ' + str(round(delay, 2)) + 's. ' + str(e))
+                sleep(delay)
+                continue
+            except Exception as e:
+                if connection:
+                    connection.end(channel)
+                    connection.breaker.release()
+                raise e
+            if connection:
+                connection.end(channel)
+                connection.report_success()
+            return result
@@ -0,0 +1,79 @@
+from concurrent.futures import Future
+from queue import Queue, Empty
+from threading import Thread
+from typing import List, Tuple
+
+from node_controller.gateway.communication import stop, stop_batch, STOP_RETRY_POLICY
+from node_controller.gateway.retry import RetryPolicy
+from node_controller.utils.lambdas import LOGGER
+
+STOP_WORKERS_DEFAULT = 2
+STOP_BATCH_MAX = 16
+STOP_REQUEUE_MAX = 3
+
+
+class StopQueue(object):
+    # Stops instances in the background. Each worker takes up to batch_max queued tokens and sends them
+    #  over a single StopService stream; the tokens the node didn't answer go back to the queue, at most
+    #  requeue_max times. When a batch fails, or a token has been re-queued too often, the tokens not answered
+    #  are stopped one by one. Each stop is reported through the Future returned by submit().
+
+    def __init__(self,
+                 gateway_stub,
+                 workers: int = STOP_WORKERS_DEFAULT,
+                 batch_max: int = STOP_BATCH_MAX,
+                 retry_policy: RetryPolicy = STOP_RETRY_POLICY,
+                 requeue_max: int = STOP_REQUEUE_MAX
+                 ):
+        self.gateway_stub = gateway_stub
+        self.batch_max = batch_max
+        self.requeue_max = requeue_max
+        self.retry_policy = retry_policy
+        self.queue: Queue = Queue()
+        for i in range(workers):
+            Thread(target=self.run, name='DependencyStopper-' + str(i), daemon=True).start()
+
+    def submit(self, token: str) -> Future:
+        future = Future()
+        self.queue.put((token, future, 0))
+        return future
+
+    def __batch(self) -> List[Tuple[str, Future, int]]:
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def __stop(self, token: str, future: Future):
+        try:
+            stop(gateway_stub=self.gateway_stub, token=token, retry_policy=self.retry_policy)
+            future.set_result(None)
+        except Exception as e:
+            LOGGER('ERROR stopping the instance ' + str(token) + ', ' + str(e))
+            future.set_exception(e)
+
+    def run(self):
+        while True:
+            batch = self.__batch()
+            answered = iter([future for _, future, _ in batch])
+            try:
+                stopped = stop_batch(
+                    gateway_stub=self.gateway_stub,
+                    tokens=[token for token, _, _ in batch],
+                    retry_policy=self.retry_policy,
+                    stopped=lambda token: next(answered).set_result(None)
+                )
+            except Exception as e:
+                LOGGER('ERROR stopping ' + str(len(batch)) + ' instances in a batch, ' + str(e))
+                stopped = 0
+
+            for token, future, requeues in batch:
+                if future.done():
+                    continue
+                if stopped and requeues < self.requeue_max:
+                    self.queue.put((token, future, requeues + 1))
+                else:
+                    self.__stop(token, future)
@@ -1,12 +0,0 @@
-import socket
-
-
-def is_open(timeout, ip, port):
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((ip, port))
-        sock.close()
-        return True
-    except Exception:
-        return False
\ No newline at end of file
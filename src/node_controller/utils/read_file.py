@@ -3,7 +3,9 @@ import os
 from grpcbigbuffer.utils import WITHOUT_BLOCK_POINTERS_FILE_NAME
 
 from node_controller.gateway.protos import celaut_pb2
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+
+from resource_manager.resourcemanager import ResourceManager
 
 
 def generator(filename):
@@ -12,12 +14,25 @@ def generator(filename):
             yield chunk
 
 
-def read_file(filename) -> bytes:
-    return b''.join([b for b in generator(filename)])
+def read_file(filename, locker=None) -> bytes:
+    if not locker:
+        return b''.join([b for b in generator(filename)])
+
+    # Reserves each chunk as it is read, instead of the whole file up front, and the joined copy before
+    #  it is made. Once the chunks are freed, their bytes are left for the caller to parse the content.
+    chunks = []
+    for chunk in generator(filename):
+        locker.grow(len(chunk))
+        chunks.append(chunk)
+    locker.grow(sum(len(chunk) for chunk in chunks))
+    return b''.join(chunks)
 
 
-def get_from_registry(service_hash: str, registry: str, mem_manager: Callable[[int], Any])\
-        -> celaut_pb2.Service():
+def get_from_registry(service_hash: str, registry: str,
+                      mem_manager: Optional[Callable[[int], Any]] = None,
+                      locker: Optional[ResourceManager.RamLocker] = None) -> celaut_pb2.Service():
+    # A held locker grows while the file is read, and keeps the reservation of the returned service.
+    #  Without one, twice the file size is reserved up front with mem_manager.
     filename: str = registry + service_hash
     if not os.path.exists(filename):
         raise Exception("Error reading the file. It doesn't exists.")
@@ -25,8 +40,11 @@ def get_from_registry(service_hash: str, registry: str, mem_manager: Callable[[i
     if os.path.isdir(filename):
         filename = filename + '/' + WITHOUT_BLOCK_POINTERS_FILE_NAME
     try:
+        service = celaut_pb2.Service()
+        if locker:
+            service.ParseFromString(read_file(filename=filename, locker=locker))
+            return service
         with mem_manager(2 * os.path.getsize(filename)):
-            service = celaut_pb2.Service()
             service.ParseFromString(read_file(filename=filename))
             return service
     except (IOError, FileNotFoundError):
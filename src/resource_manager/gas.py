@@ -0,0 +1,47 @@
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+GAS_HORIZON = 60  # Seconds of burn that the gas must cover before the pool is grown.
+
+
+class GasCostModel(ABC):
+    # Gas charged per second for keeping `amount` bytes reserved on the node.
+
+    @abstractmethod
+    def rate(self, amount: int) -> float:
+        pass
+
+    def cost(self, amount: int, seconds: float) -> float:
+        return self.rate(amount) * seconds
+
+    def affordable(self, gas: float, seconds: float, limit: int) -> int:
+        # Largest amount (up to limit) whose cost over `seconds` fits in `gas`. Assumes a rate that
+        #  does not decrease with the amount.
+        if self.cost(limit, seconds) <= gas:
+            return limit
+        low, high = 0, limit
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.cost(middle, seconds) <= gas:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+
+class PolynomialGasCost(GasCostModel):
+    # rate(amount) = c0 + c1 * amount + c2 * amount^2 + ...
+
+    def __init__(self, coefficients: Sequence[float]):
+        self.coefficients = list(coefficients)
+
+    def rate(self, amount: int) -> float:
+        rate = 0.0
+        for coefficient in reversed(self.coefficients):
+            rate = rate * amount + coefficient
+        return rate
+
+
+class LinearGasCost(PolynomialGasCost):
+    def __init__(self, gas_per_byte_second: float, base: float = 0):
+        super().__init__(coefficients=[base, gas_per_byte_second])
@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from collections import deque
+from threading import Lock
+from time import monotonic, time
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+LOCK_WAIT_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 0.5, 1, 5, 30, 60)  # seconds.
+RESERVATION_SIZE_BUCKETS = tuple(pow(1024, 1) * pow(4, i) for i in range(13))  # 1KB .. 16GB.
+SERIES_SIZE = 3600  # Samples kept.
+SERIES_INTERVAL = 1  # Minimum seconds between two samples.
+
+
+class HistogramSnapshot(NamedTuple):
+    buckets: Tuple[float, ...]  # Upper bounds.
+    counts: List[int]  # Cumulative, the last one is +Inf.
+    sum: float
+    count: int
+
+
+class Sample(NamedTuple):
+    timestamp: float
+    ram_pool: int
+    ram_locked: int
+    ram_waiting: int
+
+
+class Histogram(object):
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> HistogramSnapshot:
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, accumulated = [], 0
+        for c in counts:
+            accumulated += c
+            cumulative.append(accumulated)
+        return HistogramSnapshot(buckets=self.buckets, counts=cumulative, sum=total, count=count)
+
+
+class TimeSeries(object):
+    # Keeps at most one sample per interval, so checking it from the hot path is just a clock read.
+
+    def __init__(self, size: int = SERIES_SIZE, interval: float = SERIES_INTERVAL):
+        self.samples = deque(maxlen=size)
+        self.interval = interval
+        self.last = 0.0
+
+    def due(self) -> bool:
+        return monotonic() - self.last >= self.interval
+
+    def record(self, ram_pool: int, ram_locked: int, ram_waiting: int):
+        self.last = monotonic()
+        self.samples.append(Sample(timestamp=time(), ram_pool=ram_pool, ram_locked=ram_locked,
+                                   ram_waiting=ram_waiting))
+
+    def snapshot(self) -> List[Sample]:
+        return list(self.samples)
+
+
+class ResourceMetrics(object):
+    def __init__(self,
+                 lock_wait_buckets: Sequence[float] = LOCK_WAIT_BUCKETS,
+                 reservation_size_buckets: Sequence[float] = RESERVATION_SIZE_BUCKETS,
+                 series_size: int = SERIES_SIZE,
+                 series_interval: float = SERIES_INTERVAL
+                 ) -> None:
+        self.lock_wait = Histogram(lock_wait_buckets)
+        self.reservation_size = Histogram(reservation_size_buckets)
+        self.series = TimeSeries(size=series_size, interval=series_interval)
+        self.denied = 0  # Non-waiting locks (wait=False) refused.
+
+
+def _format(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def to_prometheus(prefix: str,
+                  counters: Dict[str, float],
+                  gauges: Dict[str, float],
+                  histograms: Dict[str, HistogramSnapshot],
+                  labeled_gauges: Dict[str, Tuple[str, Dict[str, float]]] = None  # name -> (label, {value: gauge})
+                  ) -> str:
+    # Prometheus text exposition format.
+    lines = []
+    for kind, family in (('counter', counters), ('gauge', gauges)):
+        for name, value in family.items():
+            lines.append('# TYPE ' + prefix + '_' + name + ' ' + kind)
+            lines.append(prefix + '_' + name + ' ' + _format(value))
+    for name, (label, values) in (labeled_gauges or {}).items():
+        lines.append('# TYPE ' + prefix + '_' + name + ' gauge')
+        for label_value, value in values.items():
+            escaped = label_value.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(prefix + '_' + name + '{' + label + '="' + escaped + '"} ' + _format(value))
+    for name, histogram in histograms.items():
+        metric = prefix + '_' + name
+        lines.append('# TYPE ' + metric + ' histogram')
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            lines.append(metric + '_bucket{le="' + _format(bound) + '"} ' + str(count))
+        lines.append(metric + '_sum ' + _format(histogram.sum))
+        lines.append(metric + '_count ' + str(histogram.count))
+    return '\n'.join(lines) + '\n'
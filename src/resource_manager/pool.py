@@ -0,0 +1,98 @@
+import os
+from time import monotonic
+from typing import Callable, Optional, Tuple
+
+CGROUP_DIRECTORY = '/sys/fs/cgroup'
+POOL_TTL = 0.5  # Seconds a read of the memory usage is reused.
+
+
+def _read(filename: str) -> Optional[str]:
+    try:
+        with open(filename) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_directory(root: str) -> str:
+    # On cgroup v2 /proc/self/cgroup has a single line like '0::/path'.
+    content = _read('/proc/self/cgroup') or ''
+    for line in content.splitlines():
+        if line.startswith('0::'):
+            path = os.path.join(root, line[3:].lstrip('/'))
+            if os.path.isfile(os.path.join(path, 'memory.current')):
+                return path
+    return root
+
+
+def _meminfo() -> Tuple[int, int]:
+    # -> (total, used) in bytes.
+    values = {}
+    for line in (_read('/proc/meminfo') or '').splitlines():
+        key, _, value = line.partition(':')
+        values[key] = int(value.split()[0]) * 1024
+    total = values.get('MemTotal', 0)
+    return total, total - values.get('MemAvailable', values.get('MemFree', 0))
+
+
+class SystemRamPool(object):
+    # ram_pool_method that reports the real headroom: the memory limit minus the memory in use that is
+    #  not already accounted as locked. Reads cgroup v2 memory.max/memory.current and falls back to
+    #  /proc/meminfo, caching the result for ttl seconds. Without memory.max, the limit is the last one
+    #  granted by the node, or default_limit before any.
+
+    def __init__(self,
+                 locked: Optional[Callable[[], int]] = None,
+                 default_limit: Optional[Callable[[], int]] = None,  # Used when the cgroup has no memory.max.
+                 ttl: float = POOL_TTL,
+                 cgroup_directory: str = CGROUP_DIRECTORY
+                 ) -> None:
+        self.locked = locked
+        self.default_limit = default_limit
+        self.ttl = ttl
+        self.cgroup_directory = _cgroup_directory(cgroup_directory)
+
+        self.granted: Optional[int] = None
+        self.limit: int = 0  # Memory limit at the last read, the headroom is self.value.
+        self.value: int = 0
+        self.expiration: float = 0
+        self.settled_locked: int = 0  # Locked at the previous read, so probably already in use.
+
+    def __fallback_limit(self, total: Callable[[], int]) -> int:
+        if self.granted is not None:
+            return self.granted
+        return self.default_limit() if self.default_limit else total()
+
+    def read(self) -> Tuple[int, int]:
+        # -> (limit, used) in bytes.
+        current = _read(os.path.join(self.cgroup_directory, 'memory.current'))
+        if current is not None:
+            limit = _read(os.path.join(self.cgroup_directory, 'memory.max'))
+            if limit and limit != 'max':
+                return int(limit), int(current)
+            return self.__fallback_limit(lambda: _meminfo()[0]), int(current)
+
+        total, used = _meminfo()
+        return self.__fallback_limit(lambda: total), used
+
+    def grant(self, limit: int):
+        # The limit the node has granted.
+        self.granted = limit
+        self.invalidate()
+
+    def invalidate(self):
+        self.expiration = 0
+
+    def __call__(self) -> int:
+        now = monotonic()
+        if now >= self.expiration:
+            limit, used = self.read()
+            locked = self.locked() if self.locked else 0
+            # Locked bytes already counted in the usage are given back to the pool. The ones locked since
+            #  the previous read may not be allocated yet, so they aren't, or they would be admitted twice.
+            settled = min(locked, self.settled_locked, used)
+            self.settled_locked = locked
+            self.limit = limit
+            self.value = max(0, min(limit, limit - used + settled))
+            self.expiration = now + self.ttl
+        return self.value
@@ -0,0 +1,93 @@
+import gc
+from threading import Lock
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+
+class ReclamationStats(NamedTuple):
+    collections: int
+    collected: int
+    last_pause: float  # seconds.
+    max_pause: float
+    total_pause: float
+
+
+class ReclamationPolicy(object):
+    # Decides when a released reservation is followed by a gc.collect().
+    #  every: collect each N releases (0 disables it).
+    #  threshold: collect once this amount of bytes has been released since the last collection (0 disables it).
+    #  generation: the oldest generation collected, 0 only scans the young objects.
+    # With neither every nor threshold it never collects.
+
+    def __init__(self,
+                 every: int = 0,
+                 threshold: int = 0,
+                 generation: int = 2,
+                 on_collect: Optional[Callable[[float, int], None]] = None  # (pause, collected objects)
+                 ) -> None:
+        self.every = every
+        self.threshold = threshold
+        self.generation = generation
+        self.on_collect = on_collect
+
+        self.lock = Lock()
+        self.releases = 0
+        self.released = 0
+
+        self.collections = 0
+        self.collected = 0
+        self.last_pause = 0.0
+        self.max_pause = 0.0
+        self.total_pause = 0.0
+
+    @staticmethod
+    def never() -> 'ReclamationPolicy':
+        return ReclamationPolicy()
+
+    @staticmethod
+    def every_n(n: int, generation: int = 2) -> 'ReclamationPolicy':
+        return ReclamationPolicy(every=n, generation=generation)
+
+    @staticmethod
+    def above(threshold: int, generation: int = 2) -> 'ReclamationPolicy':
+        return ReclamationPolicy(threshold=threshold, generation=generation)
+
+    @staticmethod
+    def young(every: int = 1) -> 'ReclamationPolicy':
+        return ReclamationPolicy(every=every, generation=0)
+
+    def release(self, amount: int):
+        with self.lock:
+            self.releases += 1
+            self.released += amount
+            if not (self.every and self.releases >= self.every) \
+                    and not (self.threshold and self.released >= self.threshold):
+                return
+            self.releases = 0
+            self.released = 0
+        self.collect()
+
+    def collect(self) -> int:
+        start = perf_counter()
+        collected = gc.collect(self.generation)
+        pause = perf_counter() - start
+
+        with self.lock:
+            self.collections += 1
+            self.collected += collected
+            self.last_pause = pause
+            self.max_pause = max(self.max_pause, pause)
+            self.total_pause += pause
+
+        if self.on_collect:
+            self.on_collect(pause, collected)
+        return collected
+
+    def stats(self) -> ReclamationStats:
+        return ReclamationStats(
+            collections=self.collections,
+            collected=self.collected,
+            last_pause=self.last_pause,
+            max_pause=self.max_pause,
+            total_pause=self.total_pause
+        )
@@ -0,0 +1,102 @@
+from threading import Thread, Event
+from time import sleep, monotonic
+from typing import Callable, Optional, Tuple
+
+RENEGOTIATION_WINDOW = 0.05  # Seconds of demand coalesced into a single request.
+RENEGOTIATION_INTERVAL = 0.5  # Minimum seconds between two requests to the node.
+SHRINK_HYSTERESIS = 0.25  # Fraction of the pool that must be idle before shrinking it.
+SHRINK_DELAY = 5  # Seconds the pool must stay idle before shrinking it.
+
+
+class Renegotiator(object):
+    # Moves the calls to modify_resources out of the lock/unlock path. The lockers only signal that
+    #  the demand changed, a background thread reads it after a short window and talks to the node
+    #  without holding the accounting lock.
+
+    def __init__(self,
+                 demand: Callable[[], Tuple[int, int, int]],  # -> (min, max, current pool)
+                 modify_resources: Callable[[dict], Tuple[object, int]],
+                 apply: Callable[[object, int], None],
+                 budget: Optional[Callable[[int], int]],  # max pool -> the max pool that can be paid.
+                 log: Callable[[str], None],
+                 window: float = RENEGOTIATION_WINDOW,
+                 interval: float = RENEGOTIATION_INTERVAL,
+                 shrink_hysteresis: float = SHRINK_HYSTERESIS,
+                 shrink_delay: float = SHRINK_DELAY
+                 ) -> None:
+        self.demand = demand
+        self.modify_resources = modify_resources
+        self.apply = apply
+        self.budget = budget
+        self.log = log
+
+        self.window = window
+        self.interval = interval
+        self.shrink_hysteresis = shrink_hysteresis
+        self.shrink_delay = shrink_delay
+
+        self.last_request: float = 0
+        self.idle_since: Optional[float] = None
+        self.requests: int = 0
+        self.deferred: int = 0
+        self.failures: int = 0
+
+        self.event = Event()
+        Thread(target=self.run, name='ResourceRenegotiator', daemon=True).start()
+
+    def notify(self):
+        self.event.set()
+
+    def run(self):
+        recheck = None
+        while True:
+            self.event.wait(timeout=recheck)
+            sleep(self.window)
+            self.event.clear()
+
+            wait = self.last_request + self.interval - monotonic()
+            if wait > 0:
+                sleep(wait)
+
+            try:
+                recheck = self.__renegotiate()
+            except Exception as e:
+                self.failures += 1
+                self.log('Resource renegotiation failed: ' + str(e))
+                recheck = self.interval
+
+    def __renegotiate(self) -> Optional[float]:
+        min_amount, max_amount, pool = self.demand()
+
+        if max_amount > pool:
+            self.idle_since = None
+            if self.budget:
+                max_amount = min(max_amount, self.budget(max_amount))
+                if max_amount <= pool:
+                    # Growing can't be paid, the waiters are deferred until the demand or the gas changes.
+                    self.deferred += 1
+                    self.log('Resource growth deferred, not enough gas.')
+                    return None
+                min_amount = min(min_amount, max_amount)
+
+        elif pool - max_amount > self.shrink_hysteresis * pool:
+            now = monotonic()
+            if self.idle_since is None:
+                self.idle_since = now
+            if now - self.idle_since < self.shrink_delay:
+                return self.idle_since + self.shrink_delay - now
+            self.idle_since = None
+
+        else:
+            # Inside the hysteresis band, nothing to do.
+            self.idle_since = None
+            return None
+
+        self.last_request = monotonic()
+        self.requests += 1
+        resources, gas = self.modify_resources({
+            "min": int(min_amount),  # min resources.
+            "max": int(max_amount)  # max resources.
+        })
+        self.apply(resources, gas)
+        return None
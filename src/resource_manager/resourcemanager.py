@@ -1,58 +1,236 @@
 # I/O Big Data utils.
-import gc
-from threading import Lock
-from time import sleep
+import asyncio
+from itertools import count
+from threading import Lock, Condition
+from time import monotonic
+from typing import Dict, NamedTuple, Optional, Tuple
 
+from resource_manager.gas import GasCostModel, GAS_HORIZON
+from resource_manager.metrics import ResourceMetrics, to_prometheus
+from resource_manager.pool import SystemRamPool
+from resource_manager.reclamation import ReclamationPolicy
+from resource_manager.renegotiator import Renegotiator, RENEGOTIATION_WINDOW, RENEGOTIATION_INTERVAL, \
+    SHRINK_HYSTERESIS, SHRINK_DELAY
 from resource_manager.singleton import Singleton
+from resource_manager.subpool import SubPool, SubPoolStats, DEFAULT_POOL
 
+# Waiters re-check the pool on this interval in case ram_pool_method changes without an unlock.
+ADMISSION_RECHECK_INTERVAL = 1
+# Growing a held reservation goes ahead of every waiter: a waiter could need the bytes it holds.
+GROW_PRIORITY = float('inf')
 
-def mem_manager(len: int): return ResourceManager().lock(len=len)
+
+def mem_manager(len: int, priority: int = 0, timeout: Optional[float] = None, pool: str = DEFAULT_POOL):
+    return ResourceManager().lock(len=len, priority=priority, timeout=timeout, pool=pool)
+
+
+def amem_manager(len: int, priority: int = 0, timeout: Optional[float] = None, pool: str = DEFAULT_POOL):
+    return ResourceManager().alock(len=len, priority=priority, timeout=timeout, pool=pool)
+
+
+class ResourceStats(NamedTuple):
+    ram_pool: int
+    ram_locked: int
+    ram_available: int
+    ram_waiting: int
+    waiters: int
+    gas: int
+    gas_burn_rate: float  # gas per second.
+    gc_collections: int
+    gc_pause: float  # total seconds spent in reclamation.
 
 
 class ResourceManager(metaclass=Singleton):
     class RamLocker(object):
-        def __init__(self, _len: int, iobd):
+        def __init__(self, _len: int, iobd, priority: int = 0, timeout: Optional[float] = None,
+                     pool: str = DEFAULT_POOL):
             self.len = _len
             self.iobd = iobd
+            self.priority = priority
+            self.timeout = timeout
+            self.pool = pool
+            self.held = False
 
         def __enter__(self):
-            self.iobd.lock_ram(ram_amount=self.len)
+            if not self.held:
+                self.iobd.lock_ram(ram_amount=self.len, priority=self.priority, timeout=self.timeout,
+                                   pool=self.pool)
+                self.held = True
             return self
 
+        # Resizing a held reservation. Growing it skips the waiters, that could be waiting for it to be released.
+        #  Before it is entered, growing only changes the amount that will be locked.
+
+        def grow(self, amount: int, wait: bool = True, timeout: Optional[float] = None):
+            if self.held:
+                self.iobd.lock_ram(ram_amount=amount, wait=wait, priority=self.priority, timeout=timeout,
+                                   pool=self.pool, held=True)
+            self.len += amount
+
+        def shrink(self, amount: int):
+            amount = min(amount, self.len)
+            self.iobd.unlock_ram(ram_amount=amount, pool=self.pool)
+            self.len -= amount
+
         def unlock(self, amount: int):
-            self.iobd.unlock_ram(ram_amount=amount)
+            self.shrink(amount=amount)
+
+        def split(self, amount: int) -> 'ResourceManager.RamLocker':
+            # Hands part of the reservation to a new locker, which releases it on its own exit.
+            if not self.held:
+                raise Exception("Can't split a reservation that isn't locked.")
+            if amount > self.len:
+                raise Exception("Can't split " + str(amount) + " bytes from a reservation of " + str(self.len))
             self.len -= amount
+            part = type(self)(_len=amount, iobd=self.iobd, priority=self.priority, timeout=self.timeout,
+                              pool=self.pool)
+            part.held = True
+            return part
 
         def __exit__(self, _type, value, traceback):
-            self.iobd.unlock_ram(ram_amount=self.len)
-            gc.collect()
+            self.iobd.unlock_ram(ram_amount=self.len, pool=self.pool)
+            self.iobd.reclaim(amount=self.len)
+            self.len = 0
+            self.held = False
+
+    class AsyncRamLocker(RamLocker):
+        async def __aenter__(self):
+            if not self.held:
+                await self.iobd.alock_ram(ram_amount=self.len, priority=self.priority, timeout=self.timeout,
+                                          pool=self.pool)
+                self.held = True
+            return self
+
+        async def agrow(self, amount: int, wait: bool = True, timeout: Optional[float] = None):
+            if self.held:
+                await self.iobd.alock_ram(ram_amount=amount, wait=wait, priority=self.priority, timeout=timeout,
+                                          pool=self.pool, held=True)
+            self.len += amount
+
+        async def __aexit__(self, _type, value, traceback):
+            self.__exit__(_type, value, traceback)
+
+    class _Waiter(object):
+        # Higher priority first, FIFO (arrival order) between equal priorities.
+        __slots__ = ('amount', 'pool', 'key', 'granted', 'cancelled', 'condition')
+
+        def __init__(self, amount: int, pool: SubPool, priority: int, seq: int, lock):
+            self.amount = amount
+            self.pool = pool
+            self.key = (-priority, seq)
+            self.granted = False
+            self.cancelled = False
+            self.condition = Condition(lock)
+
+        def __lt__(self, other):
+            return self.key < other.key
+
+        def grant(self):
+            self.granted = True
+            self.condition.notify()
+
+    class _AsyncWaiter(_Waiter):
+        # Granted from any thread, the coroutine is resumed on its own loop.
+        __slots__ = ('loop', 'future')
+
+        def __init__(self, amount: int, pool: SubPool, priority: int, seq: int, lock,
+                     loop: asyncio.AbstractEventLoop):
+            super().__init__(amount=amount, pool=pool, priority=priority, seq=seq, lock=lock)
+            self.loop = loop
+            self.future = loop.create_future()
+
+        def grant(self):
+            self.granted = True
+            self.loop.call_soon_threadsafe(self.__resolve)
+
+        def __resolve(self):
+            if not self.future.done():
+                self.future.set_result(None)
 
     def __init__(self,
                  log=lambda message: print(message),
+                 log_enabled=lambda: True,
                  ram_pool_method=None,
                  gas: int = 0,
                  gas_factor: float = 1,
-                 modify_resources=None
+                 gas_function: Optional[GasCostModel] = None,
+                 gas_horizon: float = GAS_HORIZON,
+                 modify_resources=None,
+                 renegotiation_window: float = RENEGOTIATION_WINDOW,
+                 renegotiation_interval: float = RENEGOTIATION_INTERVAL,
+                 shrink_hysteresis: float = SHRINK_HYSTERESIS,
+                 shrink_delay: float = SHRINK_DELAY,
+                 reclamation: Optional[ReclamationPolicy] = None,
+                 metrics: Optional[ResourceMetrics] = None
                  ) -> None:
 
-        self.ram_pool = ram_pool_method
+        # By default the pool is the real memory headroom of the process.
+        self.ram_pool = ram_pool_method if ram_pool_method else SystemRamPool()
+        if isinstance(self.ram_pool, SystemRamPool) and not self.ram_pool.locked:
+            self.ram_pool.locked = lambda: self.ram_locked
+        # Gas reported by the node on the last renegotiation, and the estimate spent since then.
         self.gas: int = gas
-        self.gas_function = None  # TODO.
+        self.gas_spent: float = 0
+        self.gas_charged_at: float = monotonic()
+        self.gas_function: Optional[GasCostModel] = gas_function
         self.gas_factor: float = gas_factor
+        self.gas_horizon: float = gas_horizon
         self.modify_resources = modify_resources  # {min_memory_limit, max_memory_limit} -> memory_limit_updated
 
         self.log = log
+        self.log_enabled = log_enabled
+        self.reclamation: ReclamationPolicy = reclamation if reclamation else ReclamationPolicy.never()
+        self.metrics: ResourceMetrics = metrics if metrics else ResourceMetrics()
         self.ram_locked = 0
         self.get_ram_available = lambda: self.ram_pool() - self.ram_locked
         self.amount_lock = Lock()
+        self.released = Condition(self.amount_lock)
+
+        # Running counters of lock_ram calls not yet granted, guarded by amount_lock.
+        self.ram_waiting = 0
+        self.waiters = 0
 
-        self.wait = []
-        self.wait_lock = Lock()
+        # Sub-pools, each one with its own admission queue. Guarded by amount_lock.
+        self.pools: Dict[str, SubPool] = {DEFAULT_POOL: SubPool(name=DEFAULT_POOL)}
+        self.queued = 0
+        self.queue_seq = count()
+
+        self.renegotiator: Optional[Renegotiator] = Renegotiator(
+            demand=self.__demand,
+            modify_resources=self.modify_resources,
+            apply=self.__apply_resources,
+            budget=self.__affordable,
+            log=self.log,
+            window=renegotiation_window,
+            interval=renegotiation_interval,
+            shrink_hysteresis=shrink_hysteresis,
+            shrink_delay=shrink_delay
+        ) if self.modify_resources else None
 
     # General methods.
 
-    def set_log(self, log=lambda message: print(message)) -> None:
+    def set_log(self, log=lambda message: print(message), log_enabled=lambda: True) -> None:
         self.log = log
+        self.log_enabled = log_enabled
+
+    def set_reclamation(self, reclamation: ReclamationPolicy) -> None:
+        self.reclamation = reclamation
+
+    def reclaim(self, amount: int) -> None:
+        self.reclamation.release(amount=amount)
+
+    def add_pool(self, name: str, minimum: int = 0, maximum: Optional[int] = None) -> None:
+        # Creates the sub-pool or updates its limits.
+        with self.amount_lock:
+            if name in self.pools:
+                self.pools[name].minimum = minimum
+                self.pools[name].maximum = maximum
+            else:
+                self.pools[name] = SubPool(name=name, minimum=minimum, maximum=maximum)
+            self.__admit()
+
+    def pool_stats(self) -> Dict[str, SubPoolStats]:
+        return {name: pool.stats() for name, pool in list(self.pools.items())}
 
     @staticmethod
     def convert_size(size_bytes):
@@ -68,80 +246,336 @@ class ResourceManager(metaclass=Singleton):
         except ValueError:
             return "%s %s" % (size_bytes, size_name[0])
 
-    def __stats(self, message: str):
-        with self.amount_lock:
-            self.log('\n--------- ' + message + ' -------------')
-            self.log('RAM POOL       -> ' + ResourceManager.convert_size(self.ram_pool()))
-            self.log('RAM LOCKED     -> ' + ResourceManager.convert_size(self.ram_locked))
-            self.log('RAM AVAILABLE  -> ' + ResourceManager.convert_size(self.get_ram_available()))
-            self.log('RAM WAITING    -> ' + ResourceManager.convert_size(sum(self.wait)))
-            self.log('GAS            -> ' + str(self.gas))
-            self.log('-----------------------------------------\n')
+    def stats(self) -> ResourceStats:
+        # Lock-free snapshot, the fields may be mutually inconsistent by the in-flight operations.
+        ram_pool, ram_locked = self.ram_pool(), self.ram_locked
+        return ResourceStats(
+            ram_pool=ram_pool,
+            ram_locked=ram_locked,
+            ram_available=ram_pool - ram_locked,
+            ram_waiting=self.ram_waiting,
+            waiters=self.waiters,
+            gas=int(self.gas_balance()),
+            gas_burn_rate=self.burn_rate(),
+            gc_collections=self.reclamation.collections,
+            gc_pause=self.reclamation.total_pause
+        )
 
-    # Gas manager methods.
-    def __update_resources(self, modify_formula):
-        if self.modify_resources:
-            resources, self.gas = self.modify_resources(
-                {
-                    "min": int(modify_formula(min)),  # min resources.
-                    "max": int(modify_formula(sum))  # max resources.
-                }
+    def prometheus(self, prefix: str = 'celaut_resource_manager') -> str:
+        stats = self.stats()
+        reclamation = self.reclamation.stats()
+        counters = {
+            'denied_locks_total': self.metrics.denied,
+            'renegotiations_total': self.renegotiator.requests if self.renegotiator else 0,
+            'renegotiation_failures_total': self.renegotiator.failures if self.renegotiator else 0,
+            'renegotiations_deferred_total': self.renegotiator.deferred if self.renegotiator else 0,
+            'gc_collections_total': reclamation.collections,
+            'gc_pause_seconds_total': reclamation.total_pause,
+        }
+        gauges = {
+            'ram_pool_bytes': stats.ram_pool,
+            'ram_locked_bytes': stats.ram_locked,
+            'ram_available_bytes': stats.ram_available,
+            'ram_waiting_bytes': stats.ram_waiting,
+            'waiters': stats.waiters,
+            'gas': stats.gas,
+            'gas_burn_rate': stats.gas_burn_rate,
+        }
+        pools = self.pool_stats()
+        return to_prometheus(
+            prefix=prefix,
+            counters=counters,
+            gauges=gauges,
+            labeled_gauges={
+                'pool_locked_bytes': ('pool', {name: pool.ram_locked for name, pool in pools.items()}),
+                'pool_queued': ('pool', {name: pool.queued for name, pool in pools.items()}),
+            },
+            histograms={
+                'lock_wait_seconds': self.metrics.lock_wait.snapshot(),
+                'reservation_size_bytes': self.metrics.reservation_size.snapshot(),
+            }
+        )
+
+    def __observe(self, amount: int, waited: float):
+        self.metrics.lock_wait.observe(waited)
+        self.metrics.reservation_size.observe(amount)
+        self.__sample()
+
+    def __sample(self):
+        if self.metrics.series.due():
+            self.metrics.series.record(
+                ram_pool=self.ram_pool(),
+                ram_locked=self.ram_locked,
+                ram_waiting=self.ram_waiting
             )
-            self.ram_pool = lambda: resources.mem_limit
 
-    # TODO Se debe de tener en cuenta el gas a traves de su polinomio.
+    def __stats(self, message: str, amount: int):
+        if not self.log_enabled():
+            return
+        stats = self.stats()
+        self.log('\n--------- ' + message + ' ' + ResourceManager.convert_size(amount) + ' -------------')
+        self.log('RAM POOL       -> ' + ResourceManager.convert_size(stats.ram_pool))
+        self.log('RAM LOCKED     -> ' + ResourceManager.convert_size(stats.ram_locked))
+        self.log('RAM AVAILABLE  -> ' + ResourceManager.convert_size(stats.ram_available))
+        self.log('RAM WAITING    -> ' + ResourceManager.convert_size(stats.ram_waiting)
+                 + ' (' + str(stats.waiters) + ')')
+        self.log('GAS            -> ' + str(stats.gas))
+        self.log('-----------------------------------------\n')
+
+    # Gas manager methods.
+
+    def burn_rate(self) -> float:
+        # Projected gas per second for the current memory limit, what the node bills.
+        if not self.gas_function:
+            return 0
+        return self.gas_factor * self.gas_function.rate(self.__limit()[0])
+
+    def gas_balance(self) -> float:
+        return self.gas - self.gas_spent - self.burn_rate() * (monotonic() - self.gas_charged_at)
+
+    def runway(self) -> float:
+        # Seconds until the gas runs out at the current burn rate.
+        rate = self.burn_rate()
+        return self.gas_balance() / rate if rate > 0 else float('inf')
+
+    def __charge(self):
+        # Must be called with amount_lock held, before the pool changes.
+        now = monotonic()
+        self.gas_spent += self.burn_rate() * (now - self.gas_charged_at)
+        self.gas_charged_at = now
+
+    def __affordable(self, amount: int) -> int:
+        # Largest pool, up to amount, that the gas can keep for gas_horizon seconds.
+        if not self.gas_function or self.gas_factor <= 0:
+            return amount
+        with self.amount_lock:
+            balance = self.gas_balance()
+        return self.gas_function.affordable(
+            gas=max(0.0, balance) / self.gas_factor,
+            seconds=self.gas_horizon,
+            limit=amount
+        )
+
+    def __update_resources(self):
+        if self.renegotiator:
+            self.renegotiator.notify()
+
+    def __limit(self) -> Tuple[int, int]:
+        # -> (memory limit, pool). They differ with a SystemRamPool, whose pool is the headroom left by
+        #  the memory in use that isn't locked.
+        pool = self.ram_pool()
+        return (self.ram_pool.limit if isinstance(self.ram_pool, SystemRamPool) else pool), pool
+
+    def __demand(self):
+        with self.amount_lock:
+            # The min is what the next admission needs, the max is what every waiter needs. Both keep the
+            #  unused guarantees of the sub-pools, so the pool never shrinks below the sum of their minimums.
+            #  They are memory limits, so the memory in use that isn't locked is added too.
+            limit, headroom = self.__limit()
+            reserved = limit - headroom + self.ram_locked + \
+                sum(pool.unused_guarantee() for pool in self.pools.values())
+            heads = [waiter.amount for waiter in (pool.head() for pool in self.pools.values()) if waiter]
+            return reserved + (min(heads) if heads else 0), \
+                reserved + self.ram_waiting, \
+                limit
+
+    def __apply_resources(self, resources, gas: int):
+        with self.amount_lock:
+            self.__charge()
+            self.gas = gas
+            self.gas_spent = 0
+            if isinstance(self.ram_pool, SystemRamPool):
+                # The node applies the new limit to the cgroup, read it again. Without a cgroup limit the
+                #  granted one is used.
+                self.ram_pool.grant(resources.mem_limit)
+            else:
+                self.ram_pool = lambda: resources.mem_limit
+            self.__admit()
+
+    # Wait list and admission queue methods. Must be called with amount_lock held.
 
     def __push_wait_list(self, l: int):
-        with self.wait_lock:
-            self.wait.append(l)
-        if sum(self.wait) > self.get_ram_available():
-            with self.amount_lock:
-                self.__update_resources(
-                    modify_formula=lambda m: self.ram_locked + m(self.wait)
-                )
+        self.ram_waiting += l
+        self.waiters += 1
+        if self.ram_waiting > self.get_ram_available():
+            self.__update_resources()
 
     def __pop_wait_list(self, l: int):
-        with self.wait_lock:
-            self.wait.remove(l)
+        self.ram_waiting -= l
+        self.waiters -= 1
+
+    def __get_pool(self, name: str) -> SubPool:
+        try:
+            return self.pools[name]
+        except KeyError:
+            raise Exception("Pool " + name + " doesn't exist.")
+
+    def __available_for(self, pool: SubPool) -> int:
+        # Free memory minus what the other sub-pools have guaranteed and not used.
+        return self.get_ram_available() - sum(
+            other.unused_guarantee() for other in self.pools.values() if other is not pool
+        )
+
+    def __fits(self, pool: SubPool, amount: int) -> bool:
+        return pool.under_cap(amount) and self.__available_for(pool) >= amount
+
+    def __take(self, pool: SubPool, amount: int):
+        pool.locked += amount
+        self.ram_locked += amount
+
+    def __give_back(self, pool: SubPool, amount: int):
+        amount = min(amount, pool.locked)
+        pool.locked -= amount
+        self.ram_locked -= amount
+
+    def __admit(self):
+        # Grants the heads of the sub-pool queues in (priority, arrival) order. Once a head that has to
+        #  borrow is waiting for free memory, the later ones can only use their own guarantee, so a large
+        #  request is not starved by a stream of smaller ones behind it. A head over its cap only blocks
+        #  its own sub-pool.
+        while self.queued:
+            blocked = False
+            heads = sorted(
+                (waiter for waiter in (pool.head() for pool in self.pools.values()) if waiter),
+                key=lambda w: w.key
+            )
+            for waiter in heads:
+                pool: SubPool = waiter.pool
+                if not pool.under_cap(waiter.amount) or blocked and not pool.guaranteed(waiter.amount):
+                    continue
+                if self.__available_for(pool) < waiter.amount:
+                    blocked = blocked or not pool.guaranteed(waiter.amount)
+                    continue
+                pool.pop()
+                self.queued -= 1
+                self.__take(pool, waiter.amount)
+                waiter.grant()
+                break
+            else:
+                return
+
+    def __try_lock(self, pool: SubPool, ram_amount: int, wait: bool, held: bool = False) -> bool:
+        # Only bypasses the queues when nobody is waiting, to keep the admission order, or to grow a held one.
+        if ram_amount <= 0 or (held or not self.queued) and self.__fits(pool, ram_amount):
+            self.__take(pool, ram_amount)
+            return True
+        if not wait:
+            self.metrics.denied += 1
+            raise Exception
+        return False
+
+    def __enqueue(self, waiter):
+        waiter.pool.push(waiter)
+        self.queued += 1
+        self.__admit()
+
+    def __abandon(self, waiter):
+        # On timeout or cancellation. If it was granted meanwhile, the bytes are given back.
+        if waiter.granted:
+            self.__give_back(waiter.pool, waiter.amount)
+            self.released.notify_all()
+        else:
+            waiter.pool.cancel(waiter)
+            self.queued -= 1
+        # The waiter could be blocking the head of the queue.
+        self.__admit()
 
     # Manage resources methods.
 
-    def lock(self, len):
-        return self.RamLocker(_len=len, iobd=self)
+    def lock(self, len, priority: int = 0, timeout: Optional[float] = None, pool: str = DEFAULT_POOL):
+        return self.RamLocker(_len=len, iobd=self, priority=priority, timeout=timeout, pool=pool)
 
-    def lock_ram(self, ram_amount: int, wait: bool = True):
-        self.__stats('want lock ' + ResourceManager.convert_size(ram_amount))
-        self.__push_wait_list(l=ram_amount)
-        while True:
-            self.__stats('go to lock ' + ResourceManager.convert_size(ram_amount))
-            if wait:
-                self.wait_to_prevent_kill(len=ram_amount)
+    def alock(self, len, priority: int = 0, timeout: Optional[float] = None, pool: str = DEFAULT_POOL):
+        return self.AsyncRamLocker(_len=len, iobd=self, priority=priority, timeout=timeout, pool=pool)
 
-            elif not self.prevent_kill(len=ram_amount):
+    def lock_ram(self, ram_amount: int, wait: bool = True, priority: int = 0, timeout: Optional[float] = None,
+                 pool: str = DEFAULT_POOL, held: bool = False):
+        # held: the caller already holds a reservation that is growing.
+        self.__stats('want lock', ram_amount)
+        start = monotonic()
+        with self.amount_lock:
+            sub_pool: SubPool = self.__get_pool(pool)
+            self.__push_wait_list(l=ram_amount)
+            try:
+                if not self.__try_lock(pool=sub_pool, ram_amount=ram_amount, wait=wait, held=held):
+                    waiter = self._Waiter(
+                        amount=ram_amount,
+                        pool=sub_pool,
+                        priority=GROW_PRIORITY if held else priority,
+                        seq=next(self.queue_seq),
+                        lock=self.amount_lock
+                    )
+                    self.__enqueue(waiter)
+                    deadline = monotonic() + timeout if timeout is not None else None
+                    try:
+                        while not waiter.granted:
+                            interval = ADMISSION_RECHECK_INTERVAL
+                            if deadline is not None:
+                                interval = min(interval, deadline - monotonic())
+                                if interval <= 0:
+                                    raise TimeoutError
+                            if not waiter.condition.wait(timeout=interval):
+                                self.__admit()
+                    except BaseException:
+                        self.__abandon(waiter)
+                        raise
+            finally:
+                self.__pop_wait_list(l=ram_amount)
+        self.__observe(amount=ram_amount, waited=monotonic() - start)
+        self.__stats('locked', ram_amount)
+
+    async def alock_ram(self, ram_amount: int, wait: bool = True, priority: int = 0,
+                        timeout: Optional[float] = None, pool: str = DEFAULT_POOL, held: bool = False):
+        self.__stats('want lock', ram_amount)
+        start = monotonic()
+        with self.amount_lock:
+            sub_pool: SubPool = self.__get_pool(pool)
+            self.__push_wait_list(l=ram_amount)
+            try:
+                waiter = None
+                if not self.__try_lock(pool=sub_pool, ram_amount=ram_amount, wait=wait, held=held):
+                    waiter = self._AsyncWaiter(
+                        amount=ram_amount,
+                        pool=sub_pool,
+                        priority=GROW_PRIORITY if held else priority,
+                        seq=next(self.queue_seq),
+                        lock=self.amount_lock,
+                        loop=asyncio.get_running_loop()
+                    )
+                    self.__enqueue(waiter)
+            except BaseException:
                 self.__pop_wait_list(l=ram_amount)
-                raise Exception
+                raise
 
+        try:
+            if waiter:
+                async with asyncio.timeout(timeout):
+                    while not waiter.future.done():
+                        done, _ = await asyncio.wait({waiter.future}, timeout=ADMISSION_RECHECK_INTERVAL)
+                        if not done:
+                            with self.amount_lock:
+                                self.__admit()
+        except BaseException:
             with self.amount_lock:
-                if self.get_ram_available() >= ram_amount:
-                    self.ram_locked += ram_amount
-                else:
-                    continue
-            self.__pop_wait_list(l=ram_amount)
-            break
-        self.__stats('locked ' + ResourceManager.convert_size(ram_amount))
+                self.__abandon(waiter)
+            raise
+        finally:
+            with self.amount_lock:
+                self.__pop_wait_list(l=ram_amount)
+        self.__observe(amount=ram_amount, waited=monotonic() - start)
+        self.__stats('locked', ram_amount)
 
-    def unlock_ram(self, ram_amount: int):
+    def unlock_ram(self, ram_amount: int, pool: str = DEFAULT_POOL):
         with self.amount_lock:
-            if ram_amount < self.ram_locked:
-                self.ram_locked -= ram_amount
-            else:
-                self.ram_locked = 0
+            self.__give_back(self.__get_pool(pool), ram_amount)
 
-            if len(self.wait) == 0:
-                self.__update_resources(
-                    modify_formula=lambda m: self.ram_locked  # + self.gas * (X factor). TODO
-                )
-        self.__stats('unlocked ' + ResourceManager.convert_size(ram_amount))
+            self.__admit()
+            self.released.notify_all()
+
+            if self.waiters == 0:
+                self.__update_resources()
+        self.__sample()
+        self.__stats('unlocked', ram_amount)
 
     def prevent_kill(self, len: int) -> bool:
         with self.amount_lock:
@@ -149,8 +583,6 @@ class ResourceManager(metaclass=Singleton):
         return b
 
     def wait_to_prevent_kill(self, len: int) -> None:
-        while True:
-            if not self.prevent_kill(len=len):
-                sleep(1)
-            else:
-                return
+        with self.amount_lock:
+            while self.get_ram_available() < len:
+                self.released.wait(timeout=ADMISSION_RECHECK_INTERVAL)
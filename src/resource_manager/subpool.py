@@ -0,0 +1,62 @@
+import heapq
+from typing import NamedTuple, Optional
+
+DEFAULT_POOL = 'default'
+
+
+class SubPoolStats(NamedTuple):
+    name: str
+    minimum: int
+    maximum: Optional[int]
+    ram_locked: int
+    queued: int
+
+
+class SubPool(object):
+    # A named share of the ResourceManager pool. The minimum is kept free for it while unused,
+    #  the maximum caps it, and between both it borrows whatever the other sub-pools leave idle.
+    # Guarded by the ResourceManager amount_lock.
+
+    def __init__(self, name: str, minimum: int = 0, maximum: Optional[int] = None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+
+        self.locked = 0
+        self.queue = []  # Heap of waiters.
+        self.queued = 0
+
+    def unused_guarantee(self) -> int:
+        return max(0, self.minimum - self.locked)
+
+    def under_cap(self, amount: int) -> bool:
+        return self.maximum is None or self.locked + amount <= self.maximum
+
+    def guaranteed(self, amount: int) -> bool:
+        return self.locked + amount <= self.minimum
+
+    def push(self, waiter):
+        heapq.heappush(self.queue, waiter)
+        self.queued += 1
+
+    def head(self):
+        while self.queue and self.queue[0].cancelled:
+            heapq.heappop(self.queue)
+        return self.queue[0] if self.queue else None
+
+    def pop(self):
+        self.queued -= 1
+        return heapq.heappop(self.queue)
+
+    def cancel(self, waiter):
+        waiter.cancelled = True
+        self.queued -= 1
+
+    def stats(self) -> SubPoolStats:
+        return SubPoolStats(
+            name=self.name,
+            minimum=self.minimum,
+            maximum=self.maximum,
+            ram_locked=self.locked,
+            queued=self.queued
+        )
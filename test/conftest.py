@@ -0,0 +1,137 @@
+# Fixtures of the node_controller tests. They stand for the node, and skip without its dependencies.
+from concurrent.futures import Future
+from functools import partial
+from threading import Lock, Thread
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+import pytest
+
+SERVICE_HASH = 'ab' * 32
+
+
+def wait_until(condition, timeout: float = 2):
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the condition.")
+        sleep(0.005)
+
+
+class Launches(object):
+    # The launches on the node: each one returns a new instance after `delay` seconds, or raises `error`.
+
+    def __init__(self):
+        self.lock = Lock()
+        self.count = 0
+        self.delay = 0.0
+        self.error = None
+
+    def __call__(self, **kwargs):
+        with self.lock:
+            self.count += 1
+            number = self.count
+        sleep(self.delay)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(instance=number, token='token-' + str(number))
+
+
+class Stops(object):
+    # A stop queue that stops at once.
+
+    def __init__(self):
+        self.tokens = []
+
+    def submit(self, token: str) -> Future:
+        self.tokens.append(token)
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def until():
+    return wait_until
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    pytest.importorskip('grpc')
+    pytest.importorskip('grpcbigbuffer')
+    pytest.importorskip('grpc_health')
+    from node_controller.dependency_manager import service_config
+
+    launches = Launches()
+    monkeypatch.setattr(service_config, 'launch_instance', launches)
+    monkeypatch.setattr(service_config, 'get_grpc_uri', lambda instance: SimpleNamespace(ip='localhost', port=instance))
+    return launches
+
+
+@pytest.fixture
+def stops():
+    return Stops()
+
+
+@pytest.fixture
+def new_service(launches, stops):
+    from node_controller.dependency_manager.service_config import ServiceConfig
+
+    def new_service(**kwargs) -> ServiceConfig:
+        arguments = dict(
+            service_hash=SERVICE_HASH,
+            config=None,
+            timeout=1,
+            failed_attempts=3,
+            pass_timeout_times=3,
+            dynamic=False,
+            dev_client=None,
+            static_service_directory='',
+            static_metadata_directory='',
+            dynamic_service_directory='',
+            dynamic_metadata_directory='',
+            check_if_is_alive=lambda timeout: True
+        )
+        arguments.update(kwargs)
+        service = ServiceConfig(**arguments)
+        service.stop_queue = stops
+        return service
+
+    return new_service
+
+
+@pytest.fixture
+def new_interface(new_service):
+    from node_controller.dependency_manager.service_interface import ServiceInterface
+
+    def new_interface(**kwargs) -> ServiceInterface:
+        return ServiceInterface(gateway_stub=None, service_with_config=new_service(**kwargs))
+
+    return new_interface
+
+
+@pytest.fixture
+def new_dependency_manager(launches, stops, monkeypatch):
+    from node_controller.dependency_manager import dependency_manager
+    from node_controller.utils.singleton import Singleton
+
+    # Its loops never end, so they must not keep the tests running.
+    monkeypatch.setattr(dependency_manager, 'Thread', partial(Thread, daemon=True))
+    Singleton._instances.pop(dependency_manager.DependencyManager, None)
+
+    def new_dependency_manager(**kwargs):
+        kwargs.setdefault('node_url', 'localhost:1')
+        manager = dependency_manager.DependencyManager(**kwargs)
+        add_service = manager.add_service
+
+        def add_stopped_service(*args, **kwargs):
+            interface = add_service(*args, **kwargs)
+            interface.sc.stop_queue = stops
+            interface.sc.check_if_is_alive = lambda timeout: True
+            return interface
+
+        manager.add_service = add_stopped_service
+        return manager
+
+    yield new_dependency_manager
+    Singleton._instances.pop(dependency_manager.DependencyManager, None)
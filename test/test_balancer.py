@@ -0,0 +1,96 @@
+import pytest
+
+pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.dependency_manager.balancer import InstanceBalancer, LifoBalancer, PowerOfTwoBalancer, \
+    EwmaBalancer
+from node_controller.dependency_manager.service_instance import ServiceInstance
+
+
+def instances(n: int):
+    return [ServiceInstance(uri='localhost:' + str(i), token=str(i), check_if_is_alive=None) for i in range(n)]
+
+
+def test_balancer_is_abstract():
+    with pytest.raises(TypeError):
+        InstanceBalancer()
+
+
+def test_lifo_takes_the_warmest():
+    balancer = LifoBalancer()
+    a, b, c = instances(3)
+    balancer.add(a)
+    balancer.add(b)
+    balancer.add(c, deep=True)
+    assert len(balancer) == 3
+    assert balancer.take() is b
+    assert balancer.take_idle() is c
+    assert balancer.idle() == [a]
+    assert balancer.take() is a
+    with pytest.raises(IndexError):
+        balancer.take()
+    assert (a.in_flight, b.in_flight, c.in_flight) == (1, 1, 0)
+
+
+def test_concurrency_shares_an_instance():
+    balancer = LifoBalancer(concurrency=2)
+    instance, = instances(1)
+    balancer.add(instance)
+    assert balancer.take() is instance
+    assert balancer.take() is instance
+    assert instance.in_flight == 2 and not instance.balanced
+    with pytest.raises(IndexError):
+        balancer.take()
+    # Given back by one caller, it takes one more.
+    instance.in_flight -= 1
+    balancer.add(instance)
+    assert balancer.take() is instance
+    assert balancer.idle() == []
+
+
+def test_power_of_two_takes_the_least_loaded():
+    balancer = PowerOfTwoBalancer(concurrency=2)
+    a, b = instances(2)
+    balancer.add(a)
+    balancer.add(b)
+    first, second = balancer.take(), balancer.take()
+    assert {first, second} == {a, b}
+    assert (a.in_flight, b.in_flight) == (1, 1)
+
+
+def test_power_of_two_removal_keeps_the_indexes():
+    balancer = PowerOfTwoBalancer()
+    group = instances(4)
+    for instance in group:
+        balancer.add(instance)
+    balancer.discard(group[1])
+    assert len(balancer) == 3
+    for index, instance in enumerate(balancer.instances):
+        assert instance.balancer_index == index
+    assert group[1] not in balancer.instances
+    taken = {balancer.take() for _ in range(3)}
+    assert taken == {group[0], group[2], group[3]}
+    assert len(balancer) == 0
+
+
+def test_ewma_takes_the_fastest():
+    balancer = EwmaBalancer()
+    slow, fast = instances(2)
+    slow.record(latency=1.0, outcome='ok')
+    fast.record(latency=0.1, outcome='ok')
+    balancer.add(slow)
+    balancer.add(fast)
+    assert balancer.take() is fast
+
+
+def test_power_of_two_gives_the_least_recently_used_first():
+    balancer = PowerOfTwoBalancer()
+    old, new = instances(2)
+    # Clock changes move the wall time, so the order is on the monotonic one.
+    old.used_at, new.used_at = 1.0, 2.0
+    new.use_datetime = new.use_datetime.replace(year=1999)
+    balancer.add(new)
+    balancer.add(old)
+    assert balancer.idle() == [old, new]
+    assert balancer.take_idle() is old
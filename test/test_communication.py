@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from grpcbigbuffer.client import Dir
+
+from node_controller.gateway import communication, connection
+from node_controller.gateway.connection import GatewayConnection
+from node_controller.gateway.retry import RetryPolicy
+
+SERVICE_HASH = 'ab' * 32
+
+
+class Error(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class Channel(object):
+    def subscribe(self, callback, try_to_connect=False):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+    def close(self):
+        pass
+
+
+class Node(object):
+    # client_grpc over StartService: records the messages of each stream, raising the given errors first.
+
+    def __init__(self):
+        self.streams = []
+        self.errors = []
+
+    def __call__(self, method, input, **kwargs):
+        self.streams.append(list(input))
+        if self.errors:
+            raise self.errors.pop(0)
+        return iter([SimpleNamespace(token='token')])
+
+    def uploads(self):
+        return [any(isinstance(message, Dir) for message in stream) for stream in self.streams]
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = Node()
+    monkeypatch.setattr(communication, 'client_grpc', node)
+    monkeypatch.setattr(connection.grpc, 'insecure_channel', lambda target, options=None: Channel())
+    monkeypatch.setattr(connection.gateway_pb2_grpc, 'GatewayStub',
+                        lambda channel: SimpleNamespace(StartService='StartService'))
+    return node
+
+
+def launch(gateway: GatewayConnection, directory: str):
+    return communication.launch_instance(
+        gateway_stub=gateway,
+        hashes=[],
+        config=None,
+        service_hash=SERVICE_HASH,
+        static_service_directory=directory,
+        static_metadata_directory=directory,
+        dynamic_service_directory=directory,
+        dynamic_metadata_directory=directory,
+        dynamic=False,
+        dev_client=None,
+        preamble=['preamble'],
+        retry_policy=RetryPolicy(deadline=1, attempts=1)
+    )
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / SERVICE_HASH).write_bytes(b'service')
+    return str(tmp_path)
+
+
+def test_known_service_is_launched_by_hash(node, directory):
+    gateway = GatewayConnection(node_url='localhost:1')
+    assert launch(gateway, directory).token == 'token'
+    assert gateway.has_service(SERVICE_HASH)
+    launch(gateway, directory)
+    assert node.uploads() == [True, False]
+    assert node.streams[1] == ['preamble']
+
+
+def test_missing_service_is_uploaded_again(node, directory):
+    gateway = GatewayConnection(node_url='localhost:1')
+    gateway.service_received(SERVICE_HASH)
+    node.errors.append(Error(grpc.StatusCode.NOT_FOUND))
+    assert launch(gateway, directory).token == 'token'
+    assert node.uploads() == [False, True]
+    assert gateway.has_service(SERVICE_HASH)
+
+
+def test_failed_launch_does_not_mark_the_service(node, directory):
+    gateway = GatewayConnection(node_url='localhost:1')
+    node.errors.append(Error(grpc.StatusCode.INVALID_ARGUMENT))
+    with pytest.raises(grpc.RpcError):
+        launch(gateway, directory)
+    assert not gateway.has_service(SERVICE_HASH)
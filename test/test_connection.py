@@ -0,0 +1,113 @@
+import pytest
+
+grpc = pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.gateway import connection as connection_module
+from node_controller.gateway.connection import GatewayConnection
+from node_controller.gateway.retry import RetryPolicy
+
+
+class Error(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class Channel(object):
+    def __init__(self):
+        self.callbacks = []
+        self.closed = False
+
+    def subscribe(self, callback, try_to_connect=False):
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def close(self):
+        self.closed = True
+
+    def to(self, state):
+        for callback in list(self.callbacks):
+            callback(state)
+
+
+@pytest.fixture
+def channels(monkeypatch):
+    channels = []
+
+    def insecure_channel(target, options=None):
+        channels.append(Channel())
+        return channels[-1]
+
+    monkeypatch.setattr(connection_module.grpc, 'insecure_channel', insecure_channel)
+    monkeypatch.setattr(connection_module.gateway_pb2_grpc, 'GatewayStub', lambda channel: object())
+    return channels
+
+
+def unavailable() -> Error:
+    return Error(grpc.StatusCode.UNAVAILABLE)
+
+
+def test_ready_channel_is_kept(channels):
+    connection = GatewayConnection(node_url='localhost:1')
+    connection.get_stub()
+    channels[0].to(grpc.ChannelConnectivity.READY)
+    for _ in range(5):
+        connection.report_failure(unavailable())
+    assert connection.healthy()
+    assert len(channels) == 1
+
+
+def test_failed_channel_is_replaced_with_backoff(channels):
+    connection = GatewayConnection(node_url='localhost:1')
+    connection.get_stub()
+    channels[0].to(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+    assert not connection.healthy()
+    connection.report_failure(unavailable())
+    assert len(channels) == 2
+    assert channels[0].closed and not channels[0].callbacks
+    # The new one fails too, but it waits the backoff.
+    channels[1].to(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+    connection.report_failure(unavailable())
+    assert len(channels) == 2
+
+
+def test_shutdown_channel_is_replaced(channels):
+    connection = GatewayConnection(node_url='localhost:1')
+    connection.get_stub()
+    channels[0].to(grpc.ChannelConnectivity.SHUTDOWN)
+    connection.get_stub()
+    assert len(channels) == 2
+
+
+def test_replaced_channel_waits_for_its_calls(channels):
+    connection = GatewayConnection(node_url='localhost:1')
+    channel = connection.begin()
+    channels[0].to(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+    connection.report_failure(unavailable())
+    assert connection.channel is not channel
+    assert not channel.closed
+    connection.end(channel)
+    assert channel.closed
+    assert connection.active == {}
+
+
+def test_retry_policy_counts_the_calls(channels):
+    connection = GatewayConnection(node_url='localhost:1')
+    active = []
+
+    def call(timeout):
+        active.append(dict(connection.active))
+        if len(active) == 1:
+            raise unavailable()
+        return 'ok'
+
+    policy = RetryPolicy(deadline=1, attempts=2, backoff_min=0.001, backoff_max=0.002)
+    assert policy.call(call, gateway_stub=connection) == 'ok'
+    assert active == [{channels[0]: 1}, {channels[0]: 1}]
+    assert connection.active == {}
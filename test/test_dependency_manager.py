@@ -0,0 +1,76 @@
+from threading import current_thread
+from time import sleep
+
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy, PredictivePoolPolicy
+
+SERVICE_HASH = 'ab' * 32
+
+
+def test_filler_keeps_the_warm_pool(new_dependency_manager, launches, until):
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=0.05)
+    service = manager.add_service(SERVICE_HASH, pool_policy=InstancePoolPolicy(min_warm=2, max_instances=3))
+    until(lambda: service.sc.alive == 2 and len(service.sc.instances) == 2)
+    service.get_instance()
+    service.get_instance()
+    # Taken, but still alive: the warm pool is full.
+    assert launches.count == 2
+    assert service.sc.alive == 2
+
+
+def test_filler_keeps_the_spare_instances(new_dependency_manager, launches, until):
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=0.05)
+    service = manager.add_service(SERVICE_HASH, pool_policy=InstancePoolPolicy(target_spare=1, max_instances=2))
+    until(lambda: len(service.sc.instances) == 1)
+    service.get_instance()
+    until(lambda: len(service.sc.instances) == 1 and service.sc.alive == 2)
+    service.get_instance()
+    # At max_instances, there is no spare left.
+    until(lambda: service.sc.launching == 0)
+    assert (launches.count, len(service.sc.instances)) == (2, 0)
+
+
+def test_filler_caps_the_concurrent_launches(new_dependency_manager, launches, until):
+    launches.delay = 0.2
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=0.05, max_launching=2)
+    service = manager.add_service(SERVICE_HASH, pool_policy=InstancePoolPolicy(min_warm=5))
+    until(lambda: launches.count == 2)
+    assert service.sc.launching == 2
+    until(lambda: service.sc.alive == 5, timeout=3)
+    assert launches.count == 5
+
+
+def test_maintenance_only_checks_the_suspects(new_dependency_manager, stops, until):
+    manager = new_dependency_manager(maintenance_sleep_time=0.05, fill_interval=1000, idle_ttl=None,
+                                     pass_timeout_times=2, failed_attempts=2)
+    service = manager.add_service(SERVICE_HASH)
+    healthy, slow, zombie = [service.get_instance() for _ in range(3)]
+    probed = []
+    for instance in (healthy, slow, zombie):
+        service.push_instance(instance)
+        instance.check_if_is_alive = lambda timeout, instance=instance: probed.append(instance) or True
+    with service.sc.lock:
+        slow.pass_timeout = 3
+        zombie.failed_attempts = 3
+
+    until(lambda: stops.tokens == [zombie.token] and slow in probed)
+    with service.sc.lock:
+        slow.pass_timeout = 0  # Not checked again.
+    until(lambda: len(service.sc.instances) == 2)
+    assert healthy not in probed
+    assert set(service.sc.instances.idle()) == {healthy, slow}
+    assert service.sc.alive == 2
+
+
+def test_filler_stops_the_surplus_on_the_workers(new_dependency_manager, launches, stops, until):
+    threads = []
+    submit = stops.submit
+    stops.submit = lambda token: threads.append(current_thread().name) or submit(token)
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=0.05, idle_ttl=None)
+    service = manager.add_service(SERVICE_HASH, pool_policy=PredictivePoolPolicy(min_warm=1, idle_budget=0))
+    instances = [service.get_instance() for _ in range(3)]
+    for instance in instances:
+        service.push_instance(instance)
+    until(lambda: len(stops.tokens) == 2)
+    sleep(0.2)
+    assert all(name.startswith('DependencyMaintainer') for name in threads)
+    assert (launches.count, len(stops.tokens), service.sc.alive, len(service.sc.instances)) == (3, 2, 1, 1)
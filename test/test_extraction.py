@@ -0,0 +1,24 @@
+from threading import Timer
+from time import monotonic
+
+from node_controller.gateway.extraction import SERVICES_ZIP, wait_extracted
+
+
+def test_nothing_to_wait(tmp_path):
+    assert wait_extracted(str(tmp_path), timeout=0)
+
+
+def test_waits_for_the_extraction(tmp_path):
+    archive = tmp_path / SERVICES_ZIP
+    archive.write_bytes(b'')
+    Timer(0.05, archive.unlink).start()
+    start = monotonic()
+    assert wait_extracted(str(tmp_path), timeout=2)
+    assert monotonic() - start < 1
+
+
+def test_waits_up_to_the_timeout(tmp_path):
+    (tmp_path / SERVICES_ZIP).write_bytes(b'')
+    start = monotonic()
+    assert not wait_extracted(str(tmp_path), timeout=0.1)
+    assert 0.1 <= monotonic() - start < 1
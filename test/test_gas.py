@@ -0,0 +1,79 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from resource_manager.gas import GasCostModel, LinearGasCost, PolynomialGasCost
+from resource_manager.pool import SystemRamPool
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+
+@pytest.fixture
+def new_manager():
+    def new_manager(**kwargs) -> ResourceManager:
+        Singleton._instances.pop(ResourceManager, None)
+        return ResourceManager(log_enabled=lambda: False, **kwargs)
+
+    yield new_manager
+    Singleton._instances.pop(ResourceManager, None)
+
+
+def test_cost_model_is_abstract():
+    with pytest.raises(TypeError):
+        GasCostModel()
+
+
+def test_polynomial_rate():
+    model = PolynomialGasCost([1, 2, 3])
+    assert model.rate(10) == 1 + 2 * 10 + 3 * 100
+    assert model.cost(10, seconds=2) == 2 * 321
+
+
+def test_affordable_amount():
+    model = LinearGasCost(gas_per_byte_second=1)
+    assert model.affordable(gas=1000, seconds=10, limit=50) == 50
+    assert model.affordable(gas=1000, seconds=10, limit=500) == 100
+    assert model.affordable(gas=0, seconds=10, limit=500) == 0
+
+
+def test_burn_rate_and_runway(new_manager):
+    manager = new_manager(ram_pool_method=lambda: 100, gas=1000, gas_function=LinearGasCost(1), gas_factor=2)
+    assert manager.burn_rate() == 200
+    assert 4.9 < manager.runway() <= 5
+    assert manager.stats().gas <= 1000
+
+
+def test_burn_rate_is_charged_on_the_limit(new_manager, tmp_path):
+    # With 300 in use without a lock the pool is only 700, but the node bills the limit.
+    for name, value in (('memory.current', 300), ('memory.max', 1000)):
+        with open(os.path.join(tmp_path, name), 'w') as f:
+            f.write(str(value))
+    manager = new_manager(
+        ram_pool_method=SystemRamPool(cgroup_directory=str(tmp_path)),
+        gas=10 ** 6,
+        gas_function=LinearGasCost(1)
+    )
+    assert manager.ram_pool() == 700
+    assert manager.burn_rate() == 1000
+
+
+def test_growth_is_deferred_without_gas(new_manager):
+    requests = []
+
+    def modify_resources(i: dict):
+        requests.append(i)
+        return SimpleNamespace(mem_limit=i['max']), 0
+
+    manager = new_manager(
+        ram_pool_method=lambda: 100,
+        gas=0,
+        gas_function=LinearGasCost(1),
+        modify_resources=modify_resources,
+        renegotiation_window=0.01,
+        renegotiation_interval=0.01
+    )
+    with pytest.raises(TimeoutError):
+        manager.lock_ram(ram_amount=150, timeout=0.2)
+    assert requests == []
+    assert manager.renegotiator.deferred >= 1
@@ -0,0 +1,100 @@
+import pytest
+
+grpc = pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+pytest.importorskip('grpc_health')
+
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from node_controller.dependency_manager import health_probe
+from node_controller.dependency_manager.health_probe import HealthProbe
+from node_controller.dependency_manager.service_instance import ServiceInstance
+
+
+class Error(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class HealthStub(object):
+    # Answers the given statuses, or raises the given errors.
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+
+    def Check(self, request, timeout=None):
+        self.requests.append(request)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return health_pb2.HealthCheckResponse(status=answer)
+
+
+class ReadyFuture(object):
+    def __init__(self, ready: bool):
+        self.ready = ready
+        self.cancelled = False
+
+    def result(self, timeout=None):
+        if not self.ready:
+            raise grpc.FutureTimeoutError()
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def probed(stub: HealthStub, probe: HealthProbe) -> ServiceInstance:
+    instance = ServiceInstance(uri='localhost:1', token='token', check_if_is_alive=None)
+    instance.channel = object()
+    instance.stubs[health_pb2_grpc.HealthStub] = stub
+    instance.check_if_is_alive = probe.bind(instance)
+    return instance
+
+
+def test_serving_instance_is_alive():
+    stub = HealthStub(health_pb2.HealthCheckResponse.SERVING, health_pb2.HealthCheckResponse.NOT_SERVING)
+    instance = probed(stub, HealthProbe(service='service', interval=0))
+    assert instance.check_if_is_alive(timeout=1)
+    assert stub.requests[0].service == 'service'
+    assert not instance.check_if_is_alive(timeout=1)
+
+
+def test_results_are_reused_for_the_interval():
+    stub = HealthStub(health_pb2.HealthCheckResponse.SERVING)
+    instance = probed(stub, HealthProbe(interval=60))
+    assert instance.check_if_is_alive(timeout=1)
+    assert instance.check_if_is_alive(timeout=1)
+    assert len(stub.requests) == 1
+
+
+def test_failed_check_is_not_alive():
+    instance = probed(HealthStub(Error(grpc.StatusCode.UNAVAILABLE)), HealthProbe(interval=0))
+    assert not instance.check_if_is_alive(timeout=1)
+    assert instance.health_implemented
+
+
+def test_unimplemented_health_checks_the_channel(monkeypatch):
+    futures = []
+
+    def channel_ready_future(channel):
+        futures.append(ReadyFuture(ready=len(futures) == 0))
+        return futures[-1]
+
+    monkeypatch.setattr(health_probe.grpc, 'channel_ready_future', channel_ready_future)
+    probe = HealthProbe(interval=0)
+    instance = probed(HealthStub(Error(grpc.StatusCode.UNIMPLEMENTED)), probe)
+    other = probed(HealthStub(health_pb2.HealthCheckResponse.SERVING), probe)
+    # The answer proves it is alive.
+    assert instance.check_if_is_alive(timeout=1)
+    assert not instance.health_implemented
+    # Only for that instance.
+    assert other.check_if_is_alive(timeout=1)
+    assert other.health_implemented
+    assert instance.check_if_is_alive(timeout=1)
+    assert not instance.check_if_is_alive(timeout=1)
+    assert futures[1].cancelled
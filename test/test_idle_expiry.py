@@ -0,0 +1,58 @@
+from threading import Event
+from time import monotonic, sleep
+
+import pytest
+
+pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.dependency_manager.idle_expiry import IdleExpiry
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy
+from node_controller.dependency_manager.service_instance import ServiceInstance
+
+SERVICE_HASH = 'ab' * 32
+
+
+def test_idle_expiry_checks_the_due_instances():
+    checked = []
+    done = Event()
+    instance = ServiceInstance(uri='localhost:1', token='token', check_if_is_alive=None)
+
+    def check(owner, due):
+        checked.append((owner, due, monotonic()))
+        if len(checked) == 1:
+            return monotonic() + 0.05  # Used meanwhile, check it again later.
+        done.set()
+        return None
+
+    expiry = IdleExpiry(check=check, tolerance=0.01)
+    start = monotonic()
+    expiry.schedule('owner', instance, start + 0.05)
+    expiry.schedule('owner', instance, start)  # Already scheduled, ignored.
+    assert done.wait(timeout=2)
+    assert [(owner, due) for owner, due, _ in checked] == [('owner', instance)] * 2
+    assert checked[0][2] >= start + 0.04
+    assert checked[1][2] >= checked[0][2] + 0.04
+    assert not instance.expiry_scheduled
+
+
+def test_idle_instances_are_stopped_above_the_warm_pool(new_dependency_manager, stops, until):
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=1000, idle_ttl=0.1)
+    service = manager.add_service(SERVICE_HASH, pool_policy=InstancePoolPolicy(min_warm=1))
+    instances = [service.get_instance() for _ in range(3)]
+    for instance in instances:
+        service.push_instance(instance)
+    until(lambda: len(stops.tokens) == 2)
+    sleep(0.2)
+    assert (service.sc.alive, len(service.sc.instances), len(stops.tokens)) == (1, 1, 2)
+
+
+def test_idle_ttl_is_taken_from_the_manager_or_disabled(new_dependency_manager, stops):
+    manager = new_dependency_manager(maintenance_sleep_time=1000, fill_interval=1000, idle_ttl=0.05)
+    inherited = manager.add_service(SERVICE_HASH)
+    kept = manager.add_service('cd' * 32, idle_ttl=None)
+    assert (inherited.sc.idle_ttl, kept.sc.idle_ttl) == (0.05, None)
+    kept.push_instance(kept.get_instance())
+    sleep(0.2)
+    assert stops.tokens == []
+    assert len(kept.sc.instances) == 1
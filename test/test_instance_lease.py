@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+
+class DeadlineExceeded(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.DEADLINE_EXCEEDED
+
+
+def test_lease_gives_back_the_instance(new_interface):
+    service = new_interface()
+    with service.instance() as instance:
+        assert instance.in_flight == 1
+        assert len(service.sc.instances) == 0
+    assert instance.in_flight == 0
+    assert len(service.sc.instances) == 1
+    assert (instance.uses, instance.outcomes) == (1, {'ok': 1})
+    assert instance.latency_ewma is not None
+
+
+def test_lease_records_the_timeouts(new_interface):
+    service = new_interface()
+    lease = service.instance()
+    with pytest.raises(DeadlineExceeded):
+        with lease as instance:
+            raise DeadlineExceeded()
+    assert lease.outcome == 'timeout'
+    assert (instance.pass_timeout, instance.outcomes) == (1, {'timeout': 1})
+    assert len(service.sc.instances) == 1
+    # A success resets the timers.
+    with service.instance():
+        pass
+    assert instance.pass_timeout == 0
+
+
+def test_lease_does_not_blame_the_instance(new_interface):
+    service = new_interface()
+    with pytest.raises(ValueError):
+        with service.instance() as instance:
+            raise ValueError()
+    assert instance.outcomes == {'exception': 1}
+    assert (instance.pass_timeout, instance.failed_attempts) == (0, 0)
+    assert len(service.sc.instances) == 1
+
+
+def test_lease_stops_a_zombie(new_interface, stops):
+    service = new_interface(pass_timeout_times=0, check_if_is_alive=lambda timeout: False)
+    with pytest.raises(DeadlineExceeded):
+        with service.instance() as instance:
+            raise DeadlineExceeded()
+    assert stops.tokens == [instance.token]
+    assert (service.sc.alive, len(service.sc.instances)) == (0, 0)
+
+
+def test_async_lease_gives_back_the_instance(new_interface):
+    service = new_interface()
+
+    async def main():
+        async with service.instance() as instance:
+            assert instance.in_flight == 1
+        return instance
+
+    instance = asyncio.run(main())
+    assert instance.in_flight == 0
+    assert instance.outcomes == {'ok': 1}
+    assert len(service.sc.instances) == 1
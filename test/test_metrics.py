@@ -0,0 +1,63 @@
+import pytest
+
+from resource_manager.metrics import Histogram, TimeSeries, to_prometheus
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+
+@pytest.fixture
+def manager():
+    Singleton._instances.pop(ResourceManager, None)
+    yield ResourceManager(ram_pool_method=lambda: 100, log_enabled=lambda: False)
+    Singleton._instances.pop(ResourceManager, None)
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram([1, 10])
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot.counts == [2, 3, 4]
+    assert (snapshot.sum, snapshot.count) == (56.5, 4)
+
+
+def test_series_keeps_one_sample_per_interval():
+    series = TimeSeries(size=2, interval=60)
+    assert series.due()
+    series.record(ram_pool=1, ram_locked=0, ram_waiting=0)
+    assert not series.due()
+    series.interval = 0
+    series.record(ram_pool=2, ram_locked=0, ram_waiting=0)
+    series.record(ram_pool=3, ram_locked=0, ram_waiting=0)
+    assert [sample.ram_pool for sample in series.snapshot()] == [2, 3]
+
+
+def test_prometheus_format():
+    histogram = Histogram([1])
+    histogram.observe(2)
+    text = to_prometheus(
+        prefix='p',
+        counters={'c_total': 3},
+        gauges={'g': 1.5},
+        histograms={'h': histogram.snapshot()},
+        labeled_gauges={'l': ('pool', {'a"b': 7})}
+    )
+    assert text.splitlines() == [
+        '# TYPE p_c_total counter', 'p_c_total 3',
+        '# TYPE p_g gauge', 'p_g 1.5',
+        '# TYPE p_l gauge', 'p_l{pool="a\\"b"} 7',
+        '# TYPE p_h histogram', 'p_h_bucket{le="1"} 0', 'p_h_bucket{le="+Inf"} 1', 'p_h_sum 2.0', 'p_h_count 1',
+    ]
+
+
+def test_locks_are_observed(manager):
+    with manager.lock(len=60):
+        pass
+    with pytest.raises(Exception):
+        manager.lock_ram(ram_amount=200, wait=False)
+    assert manager.metrics.lock_wait.snapshot().count == 1
+    assert manager.metrics.reservation_size.snapshot().sum == 60
+    assert manager.metrics.denied == 1
+    text = manager.prometheus()
+    assert 'celaut_resource_manager_denied_locks_total 1' in text
+    assert 'celaut_resource_manager_pool_locked_bytes{pool="default"} 0' in text
@@ -0,0 +1,94 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from resource_manager.pool import SystemRamPool
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+
+class Cgroup(object):
+    # A cgroup v2 directory with memory.current and, optionally, memory.max.
+
+    def __init__(self, directory: str, current: int, limit=None):
+        self.directory = directory
+        self.write('memory.current', current)
+        if limit is not None:
+            self.write('memory.max', limit)
+
+    def write(self, name: str, value):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(str(value) + '\n')
+
+
+class Node(object):
+    # Grants whatever is asked, applying it to the cgroup when it has a memory.max.
+
+    def __init__(self, cgroup: Cgroup, applies: bool):
+        self.cgroup = cgroup
+        self.applies = applies
+        self.requests = []
+
+    def __call__(self, i: dict):
+        self.requests.append(i)
+        if self.applies:
+            self.cgroup.write('memory.max', i['max'])
+        return SimpleNamespace(mem_limit=i['max']), 0
+
+
+@pytest.fixture
+def cgroup(tmp_path):
+    return Cgroup(str(tmp_path), current=300, limit=1000)
+
+
+def test_headroom_of_the_cgroup(cgroup):
+    locked = [0]
+    pool = SystemRamPool(locked=lambda: locked[0], ttl=0, cgroup_directory=cgroup.directory)
+    assert (pool(), pool.limit) == (700, 1000)
+    cgroup.write('memory.max', 'max')
+    pool.grant(1200)
+    assert (pool(), pool.limit) == (900, 1200)
+
+
+def test_new_locks_are_credited_once_settled(cgroup):
+    locked = [0]
+    pool = SystemRamPool(locked=lambda: locked[0], ttl=0, cgroup_directory=cgroup.directory)
+    assert pool() == 700
+    locked[0] = 200
+    # Not allocated yet, so not in memory.current.
+    assert pool() == 700
+    # Allocated by now, part of the 300 in use.
+    assert pool() == 900
+
+
+def test_the_read_is_cached(cgroup):
+    pool = SystemRamPool(ttl=60, cgroup_directory=cgroup.directory)
+    assert pool() == 700
+    cgroup.write('memory.current', 500)
+    assert pool() == 700
+    pool.invalidate()
+    assert pool() == 500
+
+
+@pytest.mark.parametrize('applies', [True, False])
+def test_renegotiation_asks_for_a_limit(tmp_path, applies):
+    # Without memory.max, the granted limit is the one used.
+    cgroup = Cgroup(str(tmp_path), current=300, limit=1000 if applies else None)
+    node = Node(cgroup, applies=applies)
+    Singleton._instances.pop(ResourceManager, None)
+    try:
+        manager = ResourceManager(
+            ram_pool_method=SystemRamPool(ttl=0, default_limit=lambda: 1000, cgroup_directory=cgroup.directory),
+            log_enabled=lambda: False,
+            modify_resources=node,
+            renegotiation_window=0.01,
+            renegotiation_interval=0.01
+        )
+        assert manager.ram_pool() == 700
+        with manager.lock(len=800, timeout=2):
+            # The 300 in use without a lock stay in the limit.
+            assert node.requests == [{'min': 1100, 'max': 1100}]
+            assert manager.ram_pool.limit == 1100
+    finally:
+        Singleton._instances.pop(ResourceManager, None)
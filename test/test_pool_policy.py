@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip('grpc')
+
+from node_controller.dependency_manager.balancer import LifoBalancer
+from node_controller.dependency_manager.demand_forecast import DemandForecast
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy, PredictivePoolPolicy
+
+
+def test_deficit_keeps_the_warm_instances():
+    policy = InstancePoolPolicy(min_warm=3)
+    assert policy.deficit(alive=0, idle=0, launching=0) == 3
+    assert policy.deficit(alive=1, idle=0, launching=1) == 1
+    assert policy.deficit(alive=3, idle=0, launching=0) == 0
+
+
+def test_deficit_keeps_the_spare_instances():
+    policy = InstancePoolPolicy(target_spare=2)
+    assert policy.deficit(alive=5, idle=0, launching=0) == 2
+    assert policy.deficit(alive=5, idle=1, launching=1) == 0
+
+
+def test_deficit_is_bounded_by_max_instances():
+    policy = InstancePoolPolicy(min_warm=2, max_instances=4, target_spare=3)
+    assert policy.deficit(alive=2, idle=0, launching=1) == 1
+    assert policy.deficit(alive=4, idle=0, launching=0) == 0
+
+
+def test_max_instances_below_min_warm():
+    with pytest.raises(Exception):
+        InstancePoolPolicy(min_warm=2, max_instances=1)
+
+
+def test_no_surplus_apart_from_the_idle_expiry():
+    assert InstancePoolPolicy(min_warm=1).surplus(alive=10, idle=10) == 0
+
+
+def forecast(rate: float, lease: float) -> DemandForecast:
+    forecast = DemandForecast(interval=1)
+    forecast.level, forecast.lease_ewma = rate, lease
+    return forecast
+
+
+def test_forecast_follows_the_arrivals():
+    demand = DemandForecast(interval=1)
+    assert demand.rate() == 0
+    for _ in range(10):
+        demand.arrival()
+    demand.bucket_start -= 1  # The bucket is over.
+    assert demand.rate() == 10
+    demand.lease(2)
+    demand.lease(2)
+    assert demand.concurrency() == 20
+    # An empty bucket lowers it, and the trend points down.
+    demand.bucket_start -= 1
+    assert demand.rate() < 10
+    assert demand.rate(horizon=1) < demand.rate()
+
+
+def test_predictive_pool_is_the_forecast_concurrency():
+    policy = PredictivePoolPolicy(forecast=forecast(rate=4, lease=1), headroom=0.5, min_warm=1)
+    assert policy.warm(0) == 6
+    assert policy.deficit(alive=2, idle=0, launching=1) == 3
+    policy.max_instances = 4
+    assert policy.deficit(alive=2, idle=0, launching=1) == 1
+
+
+def test_predictive_pool_takes_the_concurrency_of_the_balancer(new_service):
+    policy = PredictivePoolPolicy(forecast=forecast(rate=4, lease=1), headroom=0.5)
+    service = new_service(pool_policy=policy, balancer=LifoBalancer(concurrency=2))
+    with service.lock:
+        assert service.launch_deficit() == 3
+
+
+def test_predictive_surplus_waits_for_the_idle_budget():
+    policy = PredictivePoolPolicy(forecast=forecast(rate=1, lease=1), headroom=0, idle_budget=1000)
+    assert policy.surplus(alive=5, idle=5) == 0
+    assert policy.surplus_cost > 0
+    # Back to the forecast, it starts again.
+    assert policy.surplus(alive=1, idle=0) == 0
+    assert policy.surplus_cost == 0
+    policy.idle_budget = 0
+    assert policy.surplus(alive=5, idle=3) == 3
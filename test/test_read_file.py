@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.utils.read_file import read_file
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+
+@pytest.fixture
+def manager():
+    Singleton._instances.pop(ResourceManager, None)
+    yield ResourceManager(ram_pool_method=lambda: 1 << 30, log_enabled=lambda: False)
+    Singleton._instances.pop(ResourceManager, None)
+
+
+def test_read_file_reserves_the_chunks_and_the_joined_copy(manager, tmp_path):
+    filename = os.path.join(tmp_path, 'service')
+    content = os.urandom(3 * 1024 * 1024 + 10)
+    with open(filename, 'wb') as f:
+        f.write(content)
+
+    with manager.lock(len=0) as locker:
+        assert read_file(filename=filename, locker=locker) == content
+        assert locker.len == manager.ram_locked == 2 * len(content)
+    assert manager.ram_locked == 0
+    assert read_file(filename=filename) == content
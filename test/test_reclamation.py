@@ -0,0 +1,44 @@
+from resource_manager.reclamation import ReclamationPolicy
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+
+def test_never_collects():
+    policy = ReclamationPolicy.never()
+    for _ in range(10):
+        policy.release(amount=1 << 30)
+    assert policy.stats().collections == 0
+
+
+def test_collects_every_n_releases():
+    policy = ReclamationPolicy.every_n(3, generation=0)
+    for _ in range(7):
+        policy.release(amount=1)
+    assert policy.stats().collections == 2
+
+
+def test_collects_above_a_threshold():
+    pauses = []
+    policy = ReclamationPolicy.above(100, generation=0)
+    policy.on_collect = lambda pause, collected: pauses.append(pause)
+    policy.release(amount=60)
+    assert policy.stats().collections == 0
+    policy.release(amount=60)
+    policy.release(amount=60)
+    stats = policy.stats()
+    assert stats.collections == 1 and len(pauses) == 1
+    assert stats.total_pause == stats.last_pause == pauses[0]
+    assert stats.max_pause >= stats.last_pause
+
+
+def test_locker_exit_goes_through_the_policy():
+    Singleton._instances.pop(ResourceManager, None)
+    try:
+        manager = ResourceManager(ram_pool_method=lambda: 100, log_enabled=lambda: False,
+                                  reclamation=ReclamationPolicy.young(every=2))
+        for _ in range(4):
+            with manager.lock(len=10):
+                pass
+        assert manager.stats().gc_collections == 2
+    finally:
+        Singleton._instances.pop(ResourceManager, None)
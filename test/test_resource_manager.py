@@ -0,0 +1,330 @@
+import asyncio
+from threading import Thread, Event
+from time import sleep, monotonic
+from types import SimpleNamespace
+
+import pytest
+
+from resource_manager.resourcemanager import ResourceManager
+from resource_manager.singleton import Singleton
+
+POOL = 100
+
+
+def new_manager(**kwargs) -> ResourceManager:
+    Singleton._instances.pop(ResourceManager, None)
+    kwargs.setdefault('ram_pool_method', lambda: POOL)
+    return ResourceManager(log_enabled=lambda: False, **kwargs)
+
+
+@pytest.fixture
+def manager():
+    yield new_manager()
+    Singleton._instances.pop(ResourceManager, None)
+
+
+def until(condition, timeout: float = 2):
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the condition.")
+        sleep(0.005)
+
+
+class Holder(object):
+    # Locks `amount` on a thread and keeps it until release().
+
+    def __init__(self, manager: ResourceManager, amount: int, name: str = '', order: list = None, **kwargs):
+        self.manager = manager
+        self.locker = manager.lock(len=amount, **kwargs)
+        self.name = name
+        self.order = order if order is not None else []
+        self.acquired = Event()
+        self.released = Event()
+        self.error = None
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            with self.locker:
+                self.order.append(self.name)
+                self.acquired.set()
+                self.released.wait()
+        except BaseException as e:
+            self.error = e
+
+    def release(self):
+        self.released.set()
+        self.thread.join(timeout=2)
+
+
+def queue(manager: ResourceManager, amount: int, name: str, order: list, **kwargs) -> Holder:
+    waiters = manager.waiters
+    holder = Holder(manager, amount, name=name, order=order, **kwargs)
+    until(lambda: manager.waiters > waiters)
+    return holder
+
+
+def test_lock_and_unlock(manager):
+    with manager.lock(len=60):
+        assert manager.ram_locked == 60
+        assert manager.stats().ram_available == 40
+    assert manager.ram_locked == 0
+
+
+def test_fifo_admission(manager):
+    order = []
+    full = Holder(manager, POOL)
+    full.acquired.wait()
+    waiters = [queue(manager, 60, name=name, order=order) for name in 'abc']
+    full.release()
+    for i, waiter in enumerate(waiters):
+        waiter.acquired.wait(timeout=2)
+        assert order == list('abc'[:i + 1])
+        waiter.release()
+
+
+def test_priority_admission(manager):
+    order = []
+    full = Holder(manager, POOL)
+    full.acquired.wait()
+    low = queue(manager, 60, name='low', order=order)
+    high = queue(manager, 60, name='high', order=order, priority=5)
+    full.release()
+    high.acquired.wait(timeout=2)
+    assert order == ['high']
+    high.release()
+    low.acquired.wait(timeout=2)
+    assert order == ['high', 'low']
+    low.release()
+
+
+def test_large_request_is_not_starved(manager):
+    order = []
+    holder = Holder(manager, 60)
+    holder.acquired.wait()
+    large = queue(manager, 95, name='large', order=order)
+    # It would fit, but it doesn't bypass the queue.
+    small = queue(manager, 10, name='small', order=order)
+    assert order == []
+    holder.release()
+    large.acquired.wait(timeout=2)
+    assert order == ['large']
+    large.release()
+    small.acquired.wait(timeout=2)
+    assert order == ['large', 'small']
+    small.release()
+
+
+def test_no_wait_is_denied(manager):
+    with pytest.raises(Exception):
+        manager.lock_ram(ram_amount=POOL + 1, wait=False)
+    assert manager.metrics.denied == 1
+    assert manager.ram_locked == 0
+
+
+def test_timeout_cleans_up(manager):
+    holder = Holder(manager, POOL)
+    holder.acquired.wait()
+    start = monotonic()
+    with pytest.raises(TimeoutError):
+        manager.lock_ram(ram_amount=50, timeout=0.1)
+    assert monotonic() - start < 1
+    assert (manager.waiters, manager.ram_waiting, manager.queued) == (0, 0, 0)
+    assert manager.pool_stats()['default'].queued == 0
+    holder.release()
+    manager.lock_ram(ram_amount=POOL, wait=False)
+    assert manager.ram_locked == POOL
+
+
+def test_async_cancel_cleans_up(manager):
+    async def main():
+        holder = Holder(manager, POOL)
+        holder.acquired.wait()
+        task = asyncio.ensure_future(manager.alock_ram(ram_amount=50))
+        while manager.waiters == 0:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert (manager.waiters, manager.ram_waiting, manager.queued) == (0, 0, 0)
+        assert manager.ram_locked == POOL
+        holder.release()
+
+    asyncio.run(main())
+    assert manager.ram_locked == 0
+
+
+def test_async_admission(manager):
+    async def main():
+        holder = Holder(manager, POOL)
+        holder.acquired.wait()
+        task = asyncio.ensure_future(manager.alock(len=40).__aenter__())
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        holder.release()
+        locker = await asyncio.wait_for(task, timeout=2)
+        assert manager.ram_locked == 40
+        await locker.__aexit__(None, None, None)
+
+    asyncio.run(main())
+    assert manager.ram_locked == 0
+
+
+def test_sub_pool_cap(manager):
+    manager.add_pool('capped', maximum=30)
+    manager.lock_ram(ram_amount=30, pool='capped')
+    with pytest.raises(Exception):
+        manager.lock_ram(ram_amount=1, wait=False, pool='capped')
+    # Only its own cap blocks it, the other sub-pools still get the rest.
+    manager.lock_ram(ram_amount=70, wait=False)
+    assert manager.pool_stats()['capped'].ram_locked == 30
+
+
+def test_sub_pool_guarantee(manager):
+    manager.add_pool('guaranteed', minimum=40)
+    with pytest.raises(Exception):
+        manager.lock_ram(ram_amount=61, wait=False)
+    manager.lock_ram(ram_amount=60, wait=False)
+    manager.lock_ram(ram_amount=40, wait=False, pool='guaranteed')
+    assert manager.ram_locked == POOL
+
+
+def test_unknown_sub_pool(manager):
+    with pytest.raises(Exception):
+        manager.lock_ram(ram_amount=1, pool='missing')
+
+
+def test_grow_and_split(manager):
+    with manager.lock(len=40) as locker:
+        locker.grow(20)
+        assert (locker.len, manager.ram_locked) == (60, 60)
+        with pytest.raises(Exception):
+            locker.split(61)
+        with locker.split(10) as part:
+            assert (locker.len, part.len, manager.ram_locked) == (50, 10, 60)
+        assert manager.ram_locked == 50
+        locker.shrink(20)
+        assert (locker.len, manager.ram_locked) == (30, 30)
+    assert manager.ram_locked == 0
+
+
+def test_grow_goes_ahead_of_the_waiters(manager):
+    order = []
+    with manager.lock(len=60) as locker:
+        waiter = queue(manager, 50, name='waiter', order=order)
+        start = monotonic()
+        locker.grow(10, timeout=1)
+        assert monotonic() - start < 0.5
+        assert manager.ram_locked == 70
+        assert order == []
+    waiter.acquired.wait(timeout=2)
+    assert order == ['waiter']
+    waiter.release()
+
+
+def test_grow_before_enter_only_resizes(manager):
+    locker = manager.lock(len=10)
+    locker.grow(5)
+    assert manager.ram_locked == 0
+    with locker:
+        assert manager.ram_locked == 15
+    assert manager.ram_locked == 0
+
+
+def test_split_needs_a_held_reservation(manager):
+    locker = manager.lock(len=10)
+    with pytest.raises(Exception):
+        locker.split(5)
+    assert manager.ram_locked == 0
+
+
+def test_async_grow(manager):
+    async def main():
+        locker = manager.alock(len=10)
+        await locker.agrow(5)
+        async with locker:
+            await locker.agrow(5)
+            assert manager.ram_locked == 20
+        assert manager.ram_locked == 0
+
+    asyncio.run(main())
+
+
+
+class Node(object):
+    # modify_resources of a node that grants whatever is asked.
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, i: dict):
+        self.requests.append(i)
+        return SimpleNamespace(mem_limit=i['max']), 0
+
+
+def renegotiating(node: Node, **kwargs) -> ResourceManager:
+    kwargs.setdefault('renegotiation_window', 0.01)
+    return new_manager(modify_resources=node, renegotiation_interval=0.01, shrink_delay=0.05, **kwargs)
+
+
+def test_renegotiation_grows_and_shrinks_the_pool():
+    node = Node()
+    manager = renegotiating(node)
+    try:
+        with manager.lock(len=150, timeout=2):
+            assert node.requests == [{'min': 150, 'max': 150}]
+            assert manager.ram_pool() == 150
+        # Once idle, after the shrink delay.
+        until(lambda: node.requests[-1]['max'] == 0)
+        assert manager.ram_pool() == 0
+    finally:
+        Singleton._instances.pop(ResourceManager, None)
+
+
+def test_renegotiation_coalesces_the_demand():
+    node = Node()
+    manager = renegotiating(node, renegotiation_window=0.2)
+    try:
+        holder = Holder(manager, POOL)
+        holder.acquired.wait()
+        waiters = [Holder(manager, 50) for _ in range(3)]
+        for waiter in waiters:
+            assert waiter.acquired.wait(timeout=2)
+        # The next admission needs 150, all of them 250.
+        assert node.requests == [{'min': 150, 'max': 250}]
+        for waiter in waiters + [holder]:
+            waiter.release()
+    finally:
+        Singleton._instances.pop(ResourceManager, None)
+
+
+def test_sub_pool_borrowing_waits_behind_a_blocked_head(manager):
+    manager.add_pool('guaranteed', minimum=20)
+    order = []
+    holder = Holder(manager, 70)
+    holder.acquired.wait()
+    large = queue(manager, 30, name='large', order=order)
+    # Within its own guarantee, it doesn't wait for the blocked head of another sub-pool.
+    small = Holder(manager, 20, name='small', order=order, pool='guaranteed')
+    assert small.acquired.wait(timeout=2)
+    assert order == ['small']
+    holder.release()
+    assert large.acquired.wait(timeout=2)
+    small.release()
+    large.release()
+
+
+def test_renegotiation_keeps_the_guarantees():
+    node = Node()
+    manager = renegotiating(node)
+    try:
+        manager.add_pool('guaranteed', minimum=40)
+        with manager.lock(len=150, timeout=2):
+            assert node.requests == [{'min': 190, 'max': 190}]
+        # Once idle it shrinks, but not below the guarantees.
+        until(lambda: node.requests[-1]['max'] < 190)
+        assert node.requests[-1] == {'min': 40, 'max': 40}
+    finally:
+        Singleton._instances.pop(ResourceManager, None)
@@ -0,0 +1,134 @@
+from time import sleep
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.gateway import connection as connection_module
+from node_controller.gateway.connection import CircuitBreaker, CircuitOpenError, GatewayConnection
+from node_controller.gateway.retry import RetryPolicy
+
+
+class Error(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class Calls(object):
+    # fn(timeout) for RetryPolicy.call, raising the given codes first.
+
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        if self.codes:
+            raise Error(self.codes.pop(0))
+        return 'ok'
+
+
+class Channel(object):
+    def subscribe(self, callback, try_to_connect=False):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    monkeypatch.setattr(connection_module.grpc, 'insecure_channel', lambda target, options=None: Channel())
+    monkeypatch.setattr(connection_module.gateway_pb2_grpc, 'GatewayStub', lambda channel: object())
+    return GatewayConnection(node_url='localhost:1')
+
+
+def fast(attempts: int = 4) -> RetryPolicy:
+    return RetryPolicy(deadline=2, attempts=attempts, backoff_min=0.001, backoff_max=0.002)
+
+
+def test_retries_transient_errors():
+    calls = Calls(grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+    assert fast().call(calls) == 'ok'
+    assert calls.timeouts == [2, 2, 2]
+
+
+def test_does_not_retry_other_errors():
+    calls = Calls(grpc.StatusCode.NOT_FOUND)
+    with pytest.raises(grpc.RpcError):
+        fast().call(calls)
+    assert len(calls.timeouts) == 1
+
+
+def test_gives_up_after_the_attempts():
+    calls = Calls(*[grpc.StatusCode.UNAVAILABLE] * 10)
+    with pytest.raises(grpc.RpcError):
+        fast(attempts=3).call(calls)
+    assert len(calls.timeouts) == 3
+
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(deadline=None, backoff_min=0.5, backoff_max=2)
+    for attempt in range(10):
+        assert 0 <= policy.delay(attempt) <= min(2, 0.5 * pow(2, attempt))
+
+
+def test_breaker_opens_and_recovers(connection):
+    connection.breaker = CircuitBreaker(failures=2, reset=0.05)
+    calls = Calls(*[grpc.StatusCode.DEADLINE_EXCEEDED] * 2)
+    with pytest.raises(CircuitOpenError):
+        fast().call(calls, gateway_stub=connection)
+    # Open, it fails without calling the gateway.
+    with pytest.raises(CircuitOpenError):
+        fast().call(calls, gateway_stub=connection)
+    assert len(calls.timeouts) == 2
+
+    sleep(0.06)
+    assert fast().call(calls, gateway_stub=connection) == 'ok'
+    assert connection.breaker.opened_at is None
+
+
+def test_breaker_lets_a_single_trial():
+    breaker = CircuitBreaker(failures=1, reset=0.01)
+    breaker.failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    sleep(0.02)
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    # A failed trial opens it again.
+    breaker.failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_answered_errors_close_the_breaker(connection):
+    connection.breaker = CircuitBreaker(failures=2, reset=30)
+    connection.report_failure(Error(grpc.StatusCode.DEADLINE_EXCEEDED))
+    connection.report_failure(Error(grpc.StatusCode.NOT_FOUND))
+    connection.report_failure(Error(grpc.StatusCode.DEADLINE_EXCEEDED))
+    connection.breaker.allow()
+
+
+def test_other_exceptions_end_the_trial(connection):
+    connection.breaker = CircuitBreaker(failures=1, reset=0.01)
+    connection.breaker.failure()
+    sleep(0.02)
+
+    def call(timeout):
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        fast().call(call, gateway_stub=connection)
+    # It says nothing about the gateway, so another trial is let through.
+    assert fast().call(Calls(), gateway_stub=connection) == 'ok'
+    assert connection.breaker.opened_at is None
@@ -0,0 +1,31 @@
+from time import monotonic
+
+
+def test_launches_run_concurrently(new_service, launches):
+    launches.delay = 0.1
+    service = new_service()
+    start = monotonic()
+    instances = list(service.launch_instances(None, 4))
+    assert monotonic() - start < 0.3
+    assert len({instance.token for instance in instances}) == 4
+    assert service.alive == 4
+
+
+def test_failed_launches_are_skipped(new_service, launches):
+    launches.error = Exception("Launch failed.")
+    service = new_service()
+    assert list(service.launch_instances(None, 3)) == []
+    assert (launches.count, service.alive) == (3, 0)
+
+
+def test_abandoned_launches_are_cancelled_or_stopped(new_service, launches, stops, until):
+    launches.delay = 0.1
+    service = new_service()
+    launching = service.launch_instances(None, 4, max_workers=1)
+    kept = next(launching)
+    launching.close()
+    # The one being launched is stopped once launched, the two not started never are.
+    until(lambda: len(stops.tokens) == 1)
+    assert stops.tokens != [kept.token]
+    assert launches.count == 2
+    assert service.alive == 1
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.dependency_manager import service_instance
+from node_controller.dependency_manager.service_instance import ServiceInstance
+from node_controller.gateway.communication import channel_options
+
+
+class Channel(object):
+    def __init__(self, uri, options, compression):
+        self.uri, self.options, self.compression = uri, options, compression
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Stub(object):
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class OtherStub(Stub):
+    pass
+
+
+@pytest.fixture
+def channels(monkeypatch):
+    channels = []
+
+    def generate_instance_channel(uri, options=None, compression=None):
+        channels.append(Channel(uri, options, compression))
+        return channels[-1]
+
+    monkeypatch.setattr(service_instance, 'generate_instance_channel', generate_instance_channel)
+    return channels
+
+
+def test_stubs_share_the_channel(channels):
+    options = channel_options(keepalive_time_ms=1000, max_message_length=1024)
+    instance = ServiceInstance(uri='localhost:1', token='token', check_if_is_alive=None, channel_options=options)
+    stub = instance.stub(Stub)
+    assert instance.stub(Stub) is stub
+    assert instance.stub(OtherStub).channel is stub.channel
+    assert len(channels) == 1
+    assert (channels[0].uri, channels[0].options) == ('localhost:1', options)
+
+
+def test_stop_closes_the_channel(channels, stops):
+    instance = ServiceInstance(uri='localhost:1', token='token', check_if_is_alive=None)
+    stub = instance.stub(Stub)
+    instance.stop_later(stops).result()
+    assert channels[0].closed
+    assert (instance.channel, instance.stubs, stops.tokens) == (None, {}, ['token'])
+    # A new use opens another one.
+    assert instance.stub(Stub) is not stub
+    assert len(channels) == 2
+
+
+def test_channel_options():
+    assert channel_options() == []
+    assert dict(channel_options(keepalive_time_ms=10, keepalive_timeout_ms=5, max_message_length=7)) == {
+        'grpc.keepalive_time_ms': 10,
+        'grpc.keepalive_permit_without_calls': 1,
+        'grpc.keepalive_timeout_ms': 5,
+        'grpc.max_send_message_length': 7,
+        'grpc.max_receive_message_length': 7
+    }
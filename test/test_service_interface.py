@@ -0,0 +1,80 @@
+import asyncio
+from threading import Thread
+from time import monotonic
+
+import pytest
+
+from node_controller.dependency_manager.pool_policy import InstancePoolPolicy
+
+
+def test_get_instance_launches_and_reuses(new_interface, launches):
+    service = new_interface()
+    instance = service.get_instance()
+    assert (launches.count, service.sc.alive, instance.in_flight) == (1, 1, 1)
+    service.push_instance(instance)
+    assert service.get_instance() is instance
+    assert launches.count == 1
+
+
+def test_get_instance_waits_up_to_the_timeout(new_interface):
+    service = new_interface(pool_policy=InstancePoolPolicy(max_instances=1))
+    service.get_instance()
+    start = monotonic()
+    with pytest.raises(TimeoutError):
+        service.get_instance(timeout=0.1)
+    assert monotonic() - start < 1
+
+
+def test_get_instance_takes_a_returned_instance(new_interface, until):
+    service = new_interface(pool_policy=InstancePoolPolicy(max_instances=1))
+    instance = service.get_instance()
+    taken = []
+    waiter = Thread(target=lambda: taken.append(service.get_instance(timeout=2)), daemon=True)
+    waiter.start()
+    until(lambda: waiter.is_alive())
+    service.push_instance(instance)
+    waiter.join(timeout=2)
+    assert taken == [instance]
+
+
+def test_async_waiters_share_a_single_instance(new_interface, launches):
+    service = new_interface(pool_policy=InstancePoolPolicy(max_instances=1))
+
+    async def use():
+        instance = await service.aget_instance(timeout=2)
+        await asyncio.sleep(0.01)
+        service.push_instance(instance)
+        return instance
+
+    async def main():
+        return await asyncio.gather(*(use() for _ in range(5)))
+
+    instances = asyncio.run(main())
+    assert len(set(instances)) == 1
+    assert (launches.count, service.sc.alive, instances[0].in_flight) == (1, 1, 0)
+
+
+def test_async_wait_up_to_the_timeout(new_interface):
+    service = new_interface(pool_policy=InstancePoolPolicy(max_instances=1))
+    service.get_instance()
+    with pytest.raises(TimeoutError):
+        asyncio.run(service.aget_instance(timeout=0.1))
+    assert not service.sc.async_waiters or all(future.done() for _, future in service.sc.async_waiters)
+
+
+def test_cancelled_launch_gives_back_the_instance(new_interface, launches, until):
+    launches.delay = 0.2
+    service = new_interface(pool_policy=InstancePoolPolicy(max_instances=1))
+
+    async def main():
+        task = asyncio.ensure_future(service.aget_instance())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    until(lambda: len(service.sc.instances) == 1)
+    instance = service.get_instance(timeout=1)
+    assert instance.in_flight == 1
+    assert (launches.count, service.sc.alive, service.sc.launching) == (1, 1, 0)
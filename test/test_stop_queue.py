@@ -0,0 +1,92 @@
+from threading import Thread
+
+import pytest
+
+pytest.importorskip('grpc')
+pytest.importorskip('grpcbigbuffer')
+
+from node_controller.gateway import stop_queue
+from node_controller.gateway.stop_queue import StopQueue
+
+
+class Node(object):
+    # stop_batch and stop of a node. Each batch answers the next count of `answers` (all by default),
+    #  then fails if `fail` is set.
+
+    def __init__(self):
+        self.batches = []
+        self.stops = []
+        self.answers = []
+        self.fail = False
+        self.stop_errors = {}
+
+    def stop_batch(self, gateway_stub, tokens, retry_policy, stopped):
+        self.batches.append(list(tokens))
+        answered = self.answers.pop(0) if self.answers else len(tokens)
+        for token in tokens[:answered]:
+            stopped(token)
+        if self.fail:
+            raise Exception("The stream broke.")
+        return answered
+
+    def stop(self, gateway_stub, token, retry_policy):
+        self.stops.append(token)
+        if token in self.stop_errors:
+            raise self.stop_errors[token]
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = Node()
+    monkeypatch.setattr(stop_queue, 'stop_batch', node.stop_batch)
+    monkeypatch.setattr(stop_queue, 'stop', node.stop)
+    return node
+
+
+def stopped(tokens, **kwargs):
+    # Queued before its worker starts, so they go in the same batches.
+    queue = StopQueue(gateway_stub=None, workers=0, **kwargs)
+    futures = [queue.submit(token) for token in tokens]
+    Thread(target=queue.run, daemon=True).start()
+    for future in futures:
+        future.exception(timeout=2)
+    return futures
+
+
+def test_tokens_are_stopped_in_batches(node):
+    futures = stopped(['a', 'b', 'c'], batch_max=2)
+    assert node.batches == [['a', 'b'], ['c']]
+    assert node.stops == []
+    assert all(future.exception() is None for future in futures)
+
+
+def test_partial_answers_are_requeued(node):
+    node.answers = [1, 1]
+    stopped(['a', 'b', 'c'], requeue_max=3)
+    assert node.batches == [['a', 'b', 'c'], ['b', 'c'], ['c']]
+    assert node.stops == []
+
+
+def test_tokens_requeued_too_often_are_stopped_one_by_one(node):
+    node.answers = [1, 1, 1]
+    stopped(['a', 'b', 'c', 'd'], requeue_max=1)
+    assert node.batches == [['a', 'b', 'c', 'd'], ['b', 'c', 'd']]
+    assert node.stops == ['c', 'd']
+
+
+def test_failed_batch_falls_back_to_one_by_one(node):
+    node.answers, node.fail = [1], True
+    futures = stopped(['a', 'b', 'c'])
+    # The answered one is not stopped again.
+    assert node.batches == [['a', 'b', 'c']]
+    assert node.stops == ['b', 'c']
+    assert all(future.exception() is None for future in futures)
+
+
+def test_failed_stop_is_reported(node):
+    node.fail = True
+    node.answers = [0]
+    node.stop_errors['b'] = Exception("Unknown token.")
+    a, b = stopped(['a', 'b'])
+    assert a.exception() is None
+    assert str(b.exception()) == "Unknown token."